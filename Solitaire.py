@@ -6,87 +6,62 @@ https://api.arcade.academy/en/development/tutorials/card_game/index.html
 This is © Copyright 2024, Paul Vincent Craven.
 """
 
-import random
 import time
 
+# Taken before arcade is imported so the startup time includes the import
+STARTUP_START = time.perf_counter()
+
+import argparse
+import random
+import tracemalloc
+from array import array
+
 import arcade
 import pyglet
 
-# Screen title and size
-SCREEN_WIDTH = 660
-SCREEN_HEIGHT = 768
+import corpus
+import journal
+import solver
+from card_textures import FACE_DOWN_IMAGE, get_texture, textures
+from engine import (CARD_VALUES, CARD_SUITS, PILE_COUNT, BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE,
+                    PLAY_PILE_1, PLAY_PILE_7, TOP_PILE_1, TOP_PILE_2, TOP_PILE_3, TOP_PILE_4,
+                    Game, card_suit, card_from_name, card_name, is_safe)
+import layout
+from layout import (SCREEN_WIDTH, SCREEN_HEIGHT, CARD_SCALE, CARD_WIDTH, CARD_HEIGHT, MAT_WIDTH, MAT_HEIGHT,
+                    BOTTOM_Y, START_X, TOP_Y, MIDDLE_Y, X_SPACING)
+
+# Screen title
 SCREEN_TITLE = "Solitaire"
 
-# Constants for sizing
-CARD_SCALE = 0.6
-
-# How big are the cards?
-CARD_WIDTH = 140 * CARD_SCALE
-CARD_HEIGHT = 190 * CARD_SCALE
-
-# How big is the mat we'll place the card on?
-# We will change the size of the mat as cards
-# are moved so mat is not normally visible
-MAT_HEIGHT = int(CARD_HEIGHT)
-MAT_WIDTH = int(CARD_WIDTH)
-
-# How much space do we leave as a gap between the mats?
-# Done as a percent of the mat size.
-VERTICAL_MARGIN_PERCENT = 0.10
-HORIZONTAL_MARGIN_PERCENT = 0.10
-
-# The Y of the bottom row (2 piles)
-BOTTOM_Y = MAT_HEIGHT / 2 + MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
-
-# The X of where to start putting things on the left side
-START_X = MAT_WIDTH / 2 + MAT_WIDTH * HORIZONTAL_MARGIN_PERCENT
-
-# Card constants
-CARD_VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-CARD_SUITS = ["Clubs", "Hearts", "Spades", "Diamonds"]
-
 # For checking the rules om moving cards
 CARD_NUMBER = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
 
-# The Y of the top row (4 piles)
-TOP_Y = SCREEN_HEIGHT - MAT_HEIGHT / 2 - MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
-
-# The Y of the middle row (7 piles)
-MIDDLE_Y = TOP_Y - MAT_HEIGHT - MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
-
-# How far apart each pile goes
-X_SPACING = MAT_WIDTH + MAT_WIDTH * HORIZONTAL_MARGIN_PERCENT
-
-# If we fan out cards stacked on each other, how far apart to fan them?
-CARD_VERTICAL_OFFSET = CARD_HEIGHT * CARD_SCALE * 0.3
-
-# Constants that represent "what pile is what" for the game
-PILE_COUNT = 13
-BOTTOM_FACE_DOWN_PILE = 0
-BOTTOM_FACE_UP_PILE = 1
-PLAY_PILE_1 = 2
-PLAY_PILE_2 = 3
-PLAY_PILE_3 = 4
-PLAY_PILE_4 = 5
-PLAY_PILE_5 = 6
-PLAY_PILE_6 = 7
-PLAY_PILE_7 = 8
-TOP_PILE_1 = 9
-TOP_PILE_2 = 10
-TOP_PILE_3 = 11
-TOP_PILE_4 = 12
-
-# Face down image
-FACE_DOWN_IMAGE = ":resources:images/cards/cardBack_red2.png"
-
 # For messages
 DEFAULT_FONT_SIZE = 14
 TEXT_LINE = 82
 TEXT_COL = CARD_WIDTH * 3
 
+# How long messages and hint outlines stay on the screen in seconds
+MESSAGE_TIME = 1
+
+# Update and draw rates while anything on the screen is changing
+ACTIVE_RATE = 1 / 60
+# Update and draw rates while nothing on the screen is changing.
+# Any key or mouse action switches back to the active rate straight away.
+IDLE_UPDATE_RATE = 1 / 10
+IDLE_DRAW_RATE = 1
+
 # Number of winning deals to find and add to file of winning deals
 NUMBER_WINNING_DEALS = 100
 
+# Card movement at the end of a game is given in pixels per frame at this rate
+SWEEP_FRAME_RATE = 60
+# Longest time step applied in one update so a stalled frame does not make cards jump
+SWEEP_MAX_STEP = 0.1
+# How far off the screen a card must be before it is dropped from the sweep
+SWEEP_MARGIN = 200
+
+
 class Card(arcade.Sprite):
     """ Card sprite """
 
@@ -103,40 +78,22 @@ class Card(arcade.Sprite):
             self.card_color = "Black"
         else:
             self.card_color = "Red"
-
-        # Reset on new game to clear cards from screen
-        self.moving_x = 0
-        self.moving_y = 0
-        self.spin = 0
-        # Delay before moving card at game end
-        # set based on card position
-        self.delay = 0
+        # Card as used by the engine
+        self.code = CARD_SUITS.index(suit) * 13 + self.number - 1
 
         # Image to use for the sprite when face up
         self.image_file_name = f":resources:images/cards/card{self.suit}{self.value}.png"
         self.is_face_up = False
-        super().__init__(FACE_DOWN_IMAGE, scale, hit_box_algorithm="None")
-
-    def move(self, game_won):
-        """Moves cards to clear screen at end of game"""
-        if self.delay == 0:
-            self.moving_x *= 0.99
-            self.center_x += self.moving_x
-            self.center_y += self.moving_y
-            self.angle += self.spin
-            if game_won and self.center_y < CARD_HEIGHT / 2:
-                self.moving_y *= -1
-        else:
-            self.delay -= 1
+        super().__init__(get_texture(FACE_DOWN_IMAGE), scale, hit_box_algorithm="None")
 
     def face_down(self):
         """ Turn card face-down """
-        self.texture = arcade.load_texture(FACE_DOWN_IMAGE)
+        self.texture = get_texture(FACE_DOWN_IMAGE)
         self.is_face_up = False
 
     def face_up(self):
         """ Turn card face-up """
-        self.texture = arcade.load_texture(self.image_file_name)
+        self.texture = get_texture(self.image_file_name)
         self.is_face_up = True
 
     @property
@@ -144,14 +101,76 @@ class Card(arcade.Sprite):
         """ Is this card face down? """
         return not self.is_face_up
 
+class CardSweep():
+    """Moves the cards off the screen at the end of a game.
+    Positions and velocities are held in flat arrays, one entry per card,
+    so each frame is a single pass over the arrays rather than a method
+    call per card. Cards that leave the screen are dropped from the arrays."""
+
+    def __init__(self, cards, game_won):
+        self.cards = list(cards)
+        self.game_won = game_won
+        self.x = array("d", [card.center_x for card in self.cards])
+        self.y = array("d", [card.center_y for card in self.cards])
+        self.angle = array("d", [card.angle for card in self.cards])
+        self.moving_x = array("d", [0.0] * len(self.cards))
+        self.moving_y = array("d", [0.0] * len(self.cards))
+        self.spin = array("d", [0.0] * len(self.cards))
+        # Frames to wait before each card starts to move
+        self.delay = array("d", [0.0] * len(self.cards))
+
+    def __len__(self):
+        return len(self.cards)
+
+    def update(self, delta_time):
+        """Advance all cards by delta_time seconds and cull those off the screen.
+        The arrays are updated in place and the cards kept are packed to the front
+        as they are passed, so no new lists are made each frame."""
+        # Movement is defined per frame so scale by the number of frames elapsed
+        frames = min(delta_time, SWEEP_MAX_STEP) * SWEEP_FRAME_RATE
+        friction = 0.99 ** frames
+        cards, x, y, angle = self.cards, self.x, self.y, self.angle
+        moving_x, moving_y, spin, delay = self.moving_x, self.moving_y, self.spin, self.delay
+        # Number of cards kept so far, which is where the next card kept goes
+        kept = 0
+        for i in range(len(cards)):
+            px, py, a, vx, vy, d = x[i], y[i], angle[i], moving_x[i], moving_y[i], delay[i]
+            if d > 0.0:
+                # Cards still waiting only count down their delay
+                d = max(d - frames, 0.0)
+            else:
+                vx *= friction
+                px += vx * frames
+                py += vy * frames
+                a += spin[i] * frames
+            if self.game_won and py < CARD_HEIGHT / 2:
+                # Bounce cards off the bottom of the screen
+                vy = abs(vy)
+            card = cards[i]
+            if not (-SWEEP_MARGIN <= px <= SCREEN_WIDTH + SWEEP_MARGIN and
+                    -SWEEP_MARGIN <= py <= SCREEN_HEIGHT + SWEEP_MARGIN):
+                # Far enough off the screen to drop
+                card.visible = False
+                continue
+            # Copy the new position back to the sprite
+            card.position = px, py
+            card.angle = a
+            cards[kept] = card
+            x[kept], y[kept], angle[kept] = px, py, a
+            moving_x[kept], moving_y[kept], spin[kept], delay[kept] = vx, vy, spin[i], d
+            kept += 1
+        if kept < len(cards):
+            for values in (cards, x, y, angle, moving_x, moving_y, spin, delay):
+                del values[kept:]
+
 class UndoRecord():
     """Record held in undo[] which record the last move"""
-    def __init__(self, from_pile, to_pile, orig_position, card):
+    def __init__(self, from_pile, to_pile, card, turned_over):
         self.from_pile = from_pile
         self.to_pile = to_pile
         self.card = card
-        self.x = orig_position[0]
-        self.y = orig_position[1]
+        # True if the move turned over the card left at the top of from_pile
+        self.turned_over = turned_over
 
 class MyGame(arcade.Window):
     """ Main application class. """
@@ -175,9 +194,8 @@ class MyGame(arcade.Window):
         # List of cards in last action for undo
         self.undo = []
 
-        # Original location of cards we are dragging with the mouse in case
-        # they have to go back.
-        self.held_cards_original_position = None
+        # Keeps the cards and mats in position as cards are moved between piles
+        self.layout = layout.Layout()
 
         # Sprite list with all the mats tha cards lay on.
         self.pile_mat_list = None
@@ -190,26 +208,31 @@ class MyGame(arcade.Window):
         # Text messages and option to deal 1 or 3 cards
         # Default to 1 as it is an easier mode
         self.cards_to_turn = 1
+        # The instructions that are always shown are drawn together in one batch
+        self.text_batch = pyglet.graphics.Batch()
         self.mode = arcade.Text(
             "Easy (M)ode - (H)int",
             TEXT_COL,
             TEXT_LINE,
             arcade.color.WHITE,
-            DEFAULT_FONT_SIZE
+            DEFAULT_FONT_SIZE,
+            batch=self.text_batch
         )
         self.reset_message = arcade.Text(
             "(N)ew random deal - (W)inning deal",
             TEXT_COL,
             self.mode.bottom - 18,
             arcade.color.WHITE,
-            DEFAULT_FONT_SIZE
+            DEFAULT_FONT_SIZE,
+            batch=self.text_batch
         )
         self.auto_message = arcade.Text(
             "(A)uto complete hand",
             TEXT_COL,
             self.mode.bottom - 40,
             arcade.color.WHITE,
-            DEFAULT_FONT_SIZE
+            DEFAULT_FONT_SIZE,
+            batch=self.text_batch
         )
         self.undo_message = arcade.Text(
             "(U)ndo last move",
@@ -254,18 +277,18 @@ class MyGame(arcade.Window):
         self.all_cards = None
         # Set to true when game won or N pressed
         self.end_game = False
+        # Moves the cards off the screen when end_game is True
+        self.sweep = None
         # To hold current deal to be saved if it is a winning deal
         self.current_card_deal = None
-        # list to hold known winning deals used if a winning deal is to be dealt
-        self.winning_deals = None
         # True if player requests a winning deal
         self.deal_a_winning_deal = False
         # list of cards that could be moved
         self.hints = []
-        # Length hint outlines shown on screen
-        self.hint_timer = 0
-        # Timer to display No more Moves
-        self.no_moves_timer = 0
+        # Time the hint outlines are removed from the screen
+        self.hint_end = 0
+        # Time the No more Moves message is removed
+        self.no_moves_end = 0
         # Set to true when auto complete requested
         self.auto_complete = False
         # Set to true if auto complete is just current deal.
@@ -280,17 +303,41 @@ class MyGame(arcade.Window):
         self.number_games = 0
         # Used in auto complete to track if there are no more moves
         self.no_more_moves = False
-        # Number of cards on last pass of face down pile used to determine that there are
-        # no more moves
-        self.last_pack_size = 0
         # Set to true when deck turned to check if there are any more moves
         self.no_cards_moved = False
-        # To show there may be no more moves
-        self.possibly_no_moves_timer = 0
+        # Time the message there may be no more moves is removed
+        self.possibly_no_moves_end = 0
+        # If True the screen is only redrawn often when something is changing
+        self.render_on_demand = True
+        # Set when something has changed that needs to be drawn
+        self.redraw_needed = True
+        # True while running at the idle update and draw rates
+        self.idle = False
+        # Set to print the time to the first frame being drawn
+        self.report_first_frame = False
+        # Played games are written to the statistics file by a background thread.
+        # Opened when the first game is recorded so it does not hold up startup.
+        self.stats = None
+        # Best moves found by the solver for deals that have been solved before,
+        # opened the first time a best move is looked up
+        self.solver_cache = None
+        # True if the solver cache knows the current deal so positions are worth looking up,
+        # None until it has been checked
+        self.deal_known = None
+        # The deal being played as a list of engine cards
+        self.deal = None
+        # Number of moves made in the current game
+        self.moves_made = 0
+        # Time the current game was dealt
+        self.game_start = 0
+        # Set once the current game has been written to the statistics
+        self.game_recorded = False
+        # Every card moved is written to the journal so the game can be carried on after a crash
+        self.journal = journal.Journal()
         # Debug to allow mat size to be shown
         # self.show_mat_hitbox = 0
-        # setup the first game
-        self.setup(False)
+        # setup the first game, carrying on with the last one if it did not finish
+        self.setup(False, self.journal.load())
 
     def get_random_movement(self):
         """Generate a random direction for card movement if game being reset"""
@@ -305,64 +352,51 @@ class MyGame(arcade.Window):
     def save_cards(self, card_list):
         """Save the winning deal to a file"""
         # Only saved if we did not load a winning deal
+        # Saved to the file for the number of cards being turned over
         if not self.deal_a_winning_deal:
-            with open("winning-deals-hard.txt", "a") as file:
-                for card in card_list:
-                    file.write(card + ",")
-                file.write("\n")
-
-    def load_a_winning_deals(self):
-        """Load the list of winning deals"""
-        if self.cards_to_turn == 1:
-            file = "winning-deals-easy.txt"
-        else:
-            file = "winning-deals-hard.txt"
-        self.winning_deals = []
-        try:
-            with open(file, "r") as file:
-                while True:
-                    line = file.readline()
-                    if not line:
-                        break
-                    self.winning_deals.append(line)
-                # Debug print
-                print(f"{len(self.winning_deals)} winning deal(s) available")
-            return True
-        except:
-            print("Error loading winning deals")
-            return False
-
+            corpus.save_deal([card_from_name(card) for card in card_list], self.cards_to_turn)
 
     def load_a_winning_deal(self):
-        """Select a random winning deal from the loaded list"""
-        self.load_a_winning_deals()
-        if len(self.winning_deals) > 0:
-            line = random.randint(0, len(self.winning_deals) - 1)
-            deck = self.winning_deals[line].split(",")
-            # Sprite list with all the cards, no matter what pile they are in.
-            self.card_list = arcade.SpriteList()
-            # Create every card
-            for i in range(0, 52):
-                suit = ""
-                match deck[i][0]:
-                    case "C":
-                        suit = CARD_SUITS[0]
-                    case "H":
-                        suit = CARD_SUITS[1]
-                    case "S":
-                        suit = CARD_SUITS[2]
-                    case "D":
-                        suit = CARD_SUITS[3]
-                if suit != "":
-                    card = Card(suit, deck[i][1:], CARD_SCALE)
-                    card.position = START_X, BOTTOM_Y
-                    self.card_list.append(card)
-            if len(self.card_list) != 52:
-                print(f"Error loading cards only {len(self.card_list)} loaded")
-                return False
-            return True
-        else:
+        """Select a random winning deal from the file for the current mode.
+        The file is only read the first time a winning deal is requested."""
+        # Debug print
+        print(f"{len(corpus.winning_deals(self.cards_to_turn))} winning deal(s) available")
+        try:
+            deck = corpus.random_winning_deal(self.cards_to_turn)
+        except ValueError as error:
+            print(f"Error loading cards {error}")
             return False
+        if deck is None:
+            return False
+        self.make_cards(deck)
+        return True
+
+    def make_cards(self, deck):
+        """Create the card sprites in the order of a deal of engine cards"""
+        # Sprite list with all the cards, no matter what pile they are in.
+        self.card_list = arcade.SpriteList()
+        # Create every card
+        for c in deck:
+            card = Card(CARD_SUITS[card_suit(c)], CARD_VALUES[c % 13], CARD_SCALE)
+            self.card_list.append(card)
+
+    def record_game(self, outcome):
+        """Queue the result of the current game to be written to the statistics file.
+        outcome is "won", "lost" or "abandoned" as kept in stats.py."""
+        import stats
+        # The game has ended so there is nothing to carry on
+        self.journal.clear()
+        if self.game_recorded:
+            return
+        self.game_recorded = True
+        if outcome == stats.ABANDONED and self.moves_made == 0:
+            # Dealing again without playing is not a game
+            return
+        source = stats.GENERATOR if self.auto_complete and not self.auto_current_deal_only else stats.PLAYER
+        if self.stats is None:
+            self.stats = stats.StatsStore()
+        self.stats.record_game(corpus.format_deal(self.deal), self.cards_to_turn, source, outcome,
+                               self.moves_made, time.monotonic() - self.game_start)
 
     def clear_cards(self):
         """Set the way cards will move at the end of a game to clear screen"""
@@ -373,26 +407,28 @@ class MyGame(arcade.Window):
             for card in pile:
                 self.all_cards.append(card)
             pile = None
+        self.sweep = CardSweep(self.all_cards, self.game_won)
         if self.game_won:
             delay = 0
             x = 5
-            for card in reversed(self.all_cards):
+            for i in reversed(range(len(self.sweep))):
                 delay += 5
-                card.delay = delay
-                card.moving_x = x
-                card.moving_y = -5
+                self.sweep.delay[i] = delay
+                self.sweep.moving_x[i] = x
+                self.sweep.moving_y[i] = -5
                 if delay % 65 == 0:
                     x -= 1
         else:
-            for card in self.all_cards:
-                card.moving_x = self.get_random_movement()
-                card.moving_y = self.get_random_movement()
-                card.spin = self.get_random_movement()
+            for i in range(len(self.sweep)):
+                self.sweep.moving_x[i] = self.get_random_movement()
+                self.sweep.moving_y[i] = self.get_random_movement()
+                self.sweep.spin[i] = self.get_random_movement()
 
-    def setup(self, winning_deal):
+    def setup(self, winning_deal, saved=None):
         """ Set up the game here. Call this function to restart the game.
             if winning_deal is True then a winning deal will be loaded
-            if False then a random deal is generated."""
+            if False then a random deal is generated.
+            If saved is a game read back from the journal it is carried on instead."""
 
         # Number of games that have been played in this run
         self.number_games += 1
@@ -403,10 +439,6 @@ class MyGame(arcade.Window):
         # List of cards we are dragging with the mouse
         self.held_cards = []
 
-        # Original location of cards we are dragging with the mouse in case
-        # they have to go back.
-        self.held_cards_original_position = []
-
         # ---  Create the mats the cards go on.
         # Sprite list with all the mats tha cards lay on.
         self.pile_mat_list: arcade.SpriteList = arcade.SpriteList()
@@ -445,7 +477,15 @@ class MyGame(arcade.Window):
 
 
         self.current_card_deal = []
-        if winning_deal and self.load_a_winning_deal():
+        if saved is not None:
+            # Carry on with the game in the journal
+            self.make_cards(saved.deal)
+            self.cards_to_turn = saved.cards_to_turn
+            self.mode.text = "Hard (M)ode - (H)int" if self.cards_to_turn == 3 else "Easy (M)ode - (H)int"
+            self.deal_a_winning_deal = saved.winning
+            if not saved.winning:
+                self.current_card_deal = [card_name(c) for c in saved.deal]
+        elif winning_deal and self.load_a_winning_deal():
             # A deal will have been loaded
             pass
         else:
@@ -453,7 +493,6 @@ class MyGame(arcade.Window):
             for card_suit in CARD_SUITS:
                 for card_value in CARD_VALUES:
                     card = Card(card_suit, card_value, CARD_SCALE)
-                    card.position = START_X, BOTTOM_Y
                     self.card_list.append(card)
 
             # Shuffle cards
@@ -465,8 +504,16 @@ class MyGame(arcade.Window):
             for card in self.card_list:
                 self.current_card_deal.append(f"{card.suit[0]}{card.value}")
 
+        # Keep the deal for the statistics before the draw order changes
+        self.deal = [card.code for card in self.card_list]
+        self.moves_made = 0
+        self.game_start = time.monotonic()
+        self.game_recorded = False
+        self.deal_known = None
+
         # Create a list of lists, each holds a pile of cards.
         self.piles = [[] for _ in range(PILE_COUNT)]
+        self.layout.waste_fan = 0
 
         # Put all the cards in the bottom face-down pile
         for card in self.card_list:
@@ -481,58 +528,87 @@ class MyGame(arcade.Window):
                 card = self.piles[BOTTOM_FACE_DOWN_PILE].pop()
                 # Put in the proper pile
                 self.piles[pile_no].append(card)
-                # Move card to same position as pile we just put it in
-                card.position = self.pile_mat_list[pile_no].position
                 # Put on top in draw order
                 self.pull_to_top(card)
 
-            for i, card in enumerate(self.piles[pile_no]):
-                # Move cards to proper position
-                card.position = self.pile_mat_list[pile_no].center_x, \
-                self.pile_mat_list[pile_no].center_y - CARD_VERTICAL_OFFSET * i
-
-            # Change mat size so it is fully covered by the card stack
-            self.resize_mat(pile_no)
+        # Position all the cards and mats
+        self.layout.mark_all()
 
         # Flip up the top cards
         for i in range(PLAY_PILE_1, PLAY_PILE_7 + 1):
             self.piles[i][-1].face_up()
 
+        if saved is not None:
+            # Put the cards back where they were rather than as dealt.
+            # The journal already carries on recording the game from load().
+            self.restore_piles(saved)
+            self.moves_made = saved.moves_made
+        else:
+            # Start the journal with a snapshot of the deal
+            self.journal.start(journal.SavedGame(
+                self.cards_to_turn, len(self.current_card_deal) != 52, self.deal,
+                [[card.code for card in pile] for pile in self.piles],
+                {card.code for card in self.card_list if card.is_face_down}, self.moves_made))
+
         # Set to true when user wins or resets game
         self.end_game = False
 
+    def restore_piles(self, saved):
+        """Put every card where it was in a game read back from the journal"""
+        cards = {card.code: card for card in self.card_list}
+        self.piles = [[cards[c] for c in pile] for pile in saved.piles]
+        for pile in self.piles:
+            for card in pile:
+                if card.code in saved.face_down:
+                    card.face_down()
+                else:
+                    card.face_up()
+                # Cards higher in a pile are drawn on top
+                self.pull_to_top(card)
+        self.layout.mark_all()
+
+    def turn_face_up(self, card):
+        """Turn a card face up if it is face down and note it in the journal"""
+        if card.is_face_down:
+            card.face_up()
+            self.journal.face_up(card.code)
+
     def store_undo(self, source_pile, to_pile):
         """Store Undo record of cards being moved"""
         self.undo.clear()
-        for index, card in enumerate(self.held_cards):
-            self.undo.append(UndoRecord(source_pile, to_pile, self.held_cards_original_position[index], card))
+        # Will the move turn over the card left at the top of the source pile?
+        pile = self.piles[source_pile]
+        below = pile.index(self.held_cards[0]) - 1
+        turned_over = PLAY_PILE_1 <= source_pile <= PLAY_PILE_7 and below >= 0 and pile[below].is_face_down
+        for card in self.held_cards:
+            self.undo.append(UndoRecord(source_pile, to_pile, card, turned_over))
 
     def on_key_press(self, symbol: int, modifiers: int):
         """ User pressed a key """
+        self.request_redraw()
         match symbol:
             case arcade.key.U:
                 # Undo last action if there is one
                 # Currently only 1 level of undo
                 if len(self.undo) > 0:
                     pile = self.undo[0].from_pile
-                    if pile >= PLAY_PILE_1 and pile <= PLAY_PILE_7:
-                        if len(self.piles[pile] > 0):
-                            self.piles[pile][-1].face_down()
+                    if self.undo[0].turned_over and len(self.piles[pile]) > 0:
+                        self.piles[pile][-1].face_down()
+                        self.journal.face_down(self.piles[pile][-1].code)
                     for u in self.undo:
                         self.move_card_to_new_pile(u.card, u.from_pile)
-                        u.card.center_x = u.x
-                        u.card.center_y = u.y
-                    self.resize_mat(u.to_pile)
                     self.undo.clear()
             case arcade.key.H:
                 # User requests a hint
                 self.find_moves(False)
             case arcade.key.N:
                 # User requests a new random deal
+                self.record_game("abandoned")
                 self.deal_a_winning_deal = False
                 self.clear_cards()
             case arcade.key.W:
                 # User requests a new winning deal
+                self.record_game("abandoned")
                 self.deal_a_winning_deal = True
                 self.clear_cards()
             case arcade.key.M:
@@ -543,10 +619,23 @@ class MyGame(arcade.Window):
                 else:
                     self.mode.text = "Hard (M)ode - (H)int"
                     self.cards_to_turn = 3
+                self.journal.mode(self.cards_to_turn)
+                # Solver results are kept for each number of cards turned over
+                self.deal_known = None
             case arcade.key.A:
                 # Auto complete the current deal
                 self.auto_complete = True
                 self.auto_current_deal_only = True
+            case arcade.key.T:
+                # Memory report, not shown on screen
+                import memory_report
+                if tracemalloc.is_tracing():
+                    print(f"{len(self.card_list)} card sprites - {len(textures)} textures loaded")
+                    memory_report.report()
+                else:
+                    memory_report.start()
+                    print("Memory tracing started - press T again for a report. "
+                          "Run with --trace-memory to include the memory used at startup.")
             case arcade.key.G:
                 # Generate further winning deals and add to file
                 self.auto_complete = True
@@ -594,6 +683,7 @@ class MyGame(arcade.Window):
                     # Save the winning deal
                     self.save_cards(self.current_card_deal)
                 self.game_won = True
+                self.record_game("won")
                 # Set card velocity to cleat the screen
                 self.clear_cards()
                 self.winning_deals_found += 1
@@ -613,6 +703,8 @@ class MyGame(arcade.Window):
         if self.auto_complete:
             # Do next move
             self.find_moves(True)
+            if not self.no_more_moves:
+                self.moves_made += 1
             # Check if we have completed game
             self.check_if_game_over()
             if self.game_won:
@@ -629,31 +721,70 @@ class MyGame(arcade.Window):
             if self.no_more_moves:
                 # There are no more moves
                 self.held_cards.clear()
-                self.no_moves_timer = 60
+                self.no_moves_end = time.monotonic() + MESSAGE_TIME
                 # Debug print
                 # for card in self.piles[BOTTOM_FACE_DOWN_PILE]:
                 #     print(f"{card.value} {card.suit}")
                 if self.auto_current_deal_only:
                     self.auto_complete = False
                 else:
+                    self.record_game("lost")
                     self.setup(False)
 
         if self.end_game:
             # In end game mode to clear screen of cards
-            for card in self.all_cards:
-                card.move(self.game_won)
-                if card.center_x < -200 or card.center_x > SCREEN_WIDTH + 200 \
-                    or card.center_y < -200 or card.center_y > SCREEN_HEIGHT + 200:
-                    self.all_cards.remove(card)
-            if len(self.all_cards) < 1:
+            self.sweep.update(delta_time)
+            if len(self.sweep) < 1:
                 # Screen cleared so set up next game
                 self.setup(self.deal_a_winning_deal)
 
+        # Force the journal to the disk now and then
+        self.journal.tick(self.moves_made)
+
+        # Remove messages once they have been shown for long enough
+        now = time.monotonic()
+        if self.hint_end and now >= self.hint_end:
+            self.hint_end = 0
+            self.hints.clear()
+            self.redraw_needed = True
+        if self.no_moves_end and now >= self.no_moves_end:
+            self.no_moves_end = 0
+            self.redraw_needed = True
+        if self.possibly_no_moves_end and now >= self.possibly_no_moves_end:
+            self.possibly_no_moves_end = 0
+            self.redraw_needed = True
+
+        if self.render_on_demand:
+            # Slow right down if nothing is moving and nothing needs to be drawn
+            busy = self.redraw_needed or self.end_game or self.auto_complete or len(self.held_cards) > 0
+            self.set_idle(not busy)
+
+    def set_idle(self, idle):
+        """Switch between the active and idle update and draw rates"""
+        if idle == self.idle:
+            return
+        self.idle = idle
+        if idle:
+            self.set_update_rate(IDLE_UPDATE_RATE)
+            self.set_draw_rate(IDLE_DRAW_RATE)
+        else:
+            self.set_update_rate(ACTIVE_RATE)
+            self.set_draw_rate(ACTIVE_RATE)
+
+    def request_redraw(self):
+        """Something has changed so draw the screen at the active rate"""
+        self.redraw_needed = True
+        self.set_idle(False)
+
     def on_draw(self):
         """ Render the screen. """
         # Clear the screen
         self.clear()
 
+        # Position the cards in any piles that have changed
+        if not self.end_game:
+            self.layout.update(self.piles, self.pile_mat_list, self.held_cards)
+
         if self.end_game:
             # Game over so just draw the full pack in motion
             self.all_cards.draw()
@@ -666,14 +797,8 @@ class MyGame(arcade.Window):
             # Draw the cards
             self.card_list.draw()
 
-            # Message re number of cards to turn
-            self.mode.draw()
-
-            # New game instruction
-            self.reset_message.draw()
-
-            # Auto complete instruction
-            self.auto_message.draw()
+            # Message re number of cards to turn, new game and auto complete instructions
+            self.text_batch.draw()
 
             # Undo instruction
             if len(self.undo) > 0:
@@ -683,20 +808,19 @@ class MyGame(arcade.Window):
             if self.game_won:
                 self.win_message.draw()
 
-            if self.no_moves_timer > 0:
-                self.no_moves_timer -= 1
+            if self.no_moves_end:
                 self.no_moves_message.draw()
 
-            if self.possibly_no_moves_timer > 0:
-                self.possibly_no_moves_timer -= 1
+            if self.possibly_no_moves_end:
                 self.possibly_no_moves_message.draw()
 
-            if self.hint_timer > 0:
-                self.hint_timer -= 1
+            if self.hint_end:
                 for card in self.hints:
                     card.draw_hit_box(arcade.color.RED, 5)
-                if self.hint_timer == 0:
-                    self.hints.clear()
+
+            if self.report_first_frame:
+                self.report_first_frame = False
+                print(f"First frame {(time.perf_counter() - STARTUP_START) * 1000:.0f} ms after start")
 
             # Debug
             # if self.show_mat_hitbox > 0:
@@ -704,18 +828,31 @@ class MyGame(arcade.Window):
             #     for mat in self.pile_mat_list:
             #         mat.draw_hit_box(arcade.color.GREEN, 5)
 
+        self.redraw_needed = False
+
 
     def find_moves(self, auto):
         """Find moves for hints and carry out the first move found if
             auto is true"""
-        if auto:
-            # Make sure mat size is correct
-            for m in range(PLAY_PILE_1, PLAY_PILE_7 + 1):
-                self.resize_mat(m)
         # Cleat the hints list
         self.hints.clear()
         # Time hint outlines will remain on screen
-        self.hint_timer = 60
+        if not auto:
+            self.hint_end = time.monotonic() + MESSAGE_TIME
+        # If the solver has already won from here just follow its move
+        move = self.cached_move()
+        if move is not None:
+            if auto:
+                self.make_engine_move(move)
+                self.no_more_moves = False
+                return
+            card = self.card_to_move(move)
+            if card is not None:
+                self.hints.append(card)
+                return
+        if auto and self.make_safe_move():
+            self.no_more_moves = False
+            return
         # Check if we can move the visible card in each play pile to top pile
         for pile_index in range(PLAY_PILE_1, PLAY_PILE_7 + 1):
             pile = self.piles[pile_index]
@@ -727,10 +864,9 @@ class MyGame(arcade.Window):
                         # If auto mode then carry out move and stop looking
                         if auto:
                             self.pull_to_top(card)
-                            card.position = self.pile_mat_list[p].position
                             self.move_card_to_new_pile(card, p)
                             if len(pile) > 0:
-                                pile[-1].face_up()
+                                self.turn_face_up(pile[-1])
                             self.no_more_moves = False
                             return
                         # Not in auto mode so add to hints list
@@ -756,26 +892,13 @@ class MyGame(arcade.Window):
                                         card = pile[c]
                                         self.held_cards.append(card)
                                         self.pull_to_top(card)
-                                    # Are there already cards in the destination pile?
-                                    if len(self.piles[p]) > 0:
-                                        # There are cards
-                                        # Move cards to be moved to proper position
-                                        top_card = self.piles[p][-1]
-                                        for i, dropped_card in enumerate(self.held_cards):
-                                            dropped_card.position = top_card.center_x, \
-                                                top_card.center_y - CARD_VERTICAL_OFFSET * (i + 1)
-                                    else:
-                                        # There are no cards in the receiving pile
-                                        # Move cards to proper position
-                                        for i, dropped_card in enumerate(self.held_cards):
-                                            dropped_card.position = self.pile_mat_list[p].center_x, \
-                                                self.pile_mat_list[p].center_y - CARD_VERTICAL_OFFSET * i
                                     for card in self.held_cards:
-                                        # Cards are in the right position, but we need to move them to the right list
+                                        # Move them to the right list, the layout will position them
                                         self.move_card_to_new_pile(card, p)
+                                    self.held_cards = []
                                     # Turn over top card in pile moved from
                                     if len(pile) > 0:
-                                        pile[-1].face_up()
+                                        self.turn_face_up(pile[-1])
                                     self.no_more_moves = False
                                     return
                                 # Not in auto mode so add to hints list
@@ -790,7 +913,6 @@ class MyGame(arcade.Window):
                     # If auto mode then carry out move and stop looking
                     if auto:
                         self.pull_to_top(card)
-                        card.position = self.pile_mat_list[p].position
                         self.move_card_to_new_pile(card, p)
                         self.no_more_moves = False
                         return
@@ -803,71 +925,132 @@ class MyGame(arcade.Window):
                     if auto:
                         # Put on top in drawing order
                         self.pull_to_top(card)
-                        if len(self.piles[p]) > 0:
-                            # There are cards in the pile being moved to
-                            # Move card to proper position
-                            top_card = self.piles[p][-1]
-                            card.position = top_card.center_x, \
-                                    top_card.center_y - CARD_VERTICAL_OFFSET
-                        else:
-                            # There no cards in the middle play pile?
-                            # Move cards to proper position
-                            card.position = self.pile_mat_list[p].center_x, \
-                                self.pile_mat_list[p].center_y
                         self.move_card_to_new_pile(card, p)
                         self.no_more_moves = False
                         return
                     # Not in auto mode so add to hints list
                     self.hints.append(card)
-        # If auto mode then try and turn over card from face down pile
+        # If auto mode then turn over cards until one that can be played is showing
         if auto:
-            if len(self.piles[BOTTOM_FACE_DOWN_PILE]) > 0:
-                # If there are cards in the face down pile turn over
-                for i in range(self.cards_to_turn):
-                    # If we ran out of cards, stop
-                    if len(self.piles[BOTTOM_FACE_DOWN_PILE]) == 0:
-                        break
-                    # Get top card
-                    card = self.piles[BOTTOM_FACE_DOWN_PILE][-1]
-                    # Flip face up
-                    card.face_up()
-                    # Move card position to bottom-right face up pile
-                    card.position = self.pile_mat_list[BOTTOM_FACE_UP_PILE].position
-                    # Remove card from face down pile
-                    self.piles[BOTTOM_FACE_DOWN_PILE].remove(card)
-                    # Move card to face up list
-                    self.piles[BOTTOM_FACE_UP_PILE].append(card)
-                    # Put on top draw-order wise
-                    self.pull_to_top(card)
+            # The engine knows which cards can be reached so they are all turned over in one step
+            moves = solver.turn_moves(self.engine_game())
+            if moves is None:
+                # No card in the face down or face up piles can be played so there are no more moves
+                self.no_more_moves = True
                 return
-            else:
-                if self.last_pack_size == len(self.piles[BOTTOM_FACE_UP_PILE]):
-                    # We have looked through the deck once and there are no more moves
-                    self.no_more_moves = True
-                self.last_pack_size = len(self.piles[BOTTOM_FACE_UP_PILE])
-                # No cards in face down pile
-                if len(self.piles[BOTTOM_FACE_UP_PILE]) > 0:
-                    # Flip the deck back over so we can restart
-                    temp_list = self.piles[BOTTOM_FACE_UP_PILE].copy()
-                    for card in reversed(temp_list):
-                        card.face_down()
-                        self.piles[BOTTOM_FACE_UP_PILE].remove(card)
-                        self.piles[BOTTOM_FACE_DOWN_PILE].append(card)
-                        card.position = self.pile_mat_list[BOTTOM_FACE_DOWN_PILE].position
-                    return
+            for move in moves:
+                self.make_engine_move(move)
+            self.no_more_moves = False
+
+    def engine_game(self):
+        """The position on the screen as an engine game"""
+        game = Game(self.deal, self.cards_to_turn)
+        for pile_index, pile in enumerate(self.piles):
+            if TOP_PILE_1 <= pile_index <= TOP_PILE_4:
+                # The engine keeps each suit on its own top pile
+                if len(pile) > 0:
+                    game.piles[game.foundation_for(pile[0].code)] = [card.code for card in pile]
+                continue
+            game.piles[pile_index] = [card.code for card in pile]
+            if PLAY_PILE_1 <= pile_index <= PLAY_PILE_7:
+                game.face_down[pile_index] = sum(1 for card in pile if card.is_face_down)
+        return game
+
+    def cached_move(self):
+        """The solver's best move from the position on the screen if it has been solved before, or None"""
+        if self.deal_known is None:
+            import solver_cache
+            if self.solver_cache is None:
+                self.solver_cache = solver_cache.SolverCache()
+            self.deal_known = self.solver_cache.has_deal(Game(self.deal, self.cards_to_turn))
+        if not self.deal_known:
+            return None
+        entry = self.solver_cache.get(self.engine_game())
+        if entry is None or entry[0] != solver.SOLVED:
+            return None
+        return entry[1]
+
+    def screen_pile(self, pile_index, card):
+        """The pile on the screen for an engine pile.
+        The engine keeps each suit on its own top pile but on the screen it can go on any."""
+        if not TOP_PILE_1 <= pile_index <= TOP_PILE_4:
+            return pile_index
+        for p in range(TOP_PILE_1, TOP_PILE_4 + 1):
+            if len(self.piles[p]) > 0 and card_suit(self.piles[p][0].code) == card_suit(card.code):
+                return p
+        for p in range(TOP_PILE_1, TOP_PILE_4 + 1):
+            if len(self.piles[p]) == 0:
+                return p
+
+    def card_to_move(self, move):
+        """The card to outline as the hint for an engine move or None if it is turning the pack over"""
+        from_pile, to_pile, count = move
+        if to_pile == BOTTOM_FACE_DOWN_PILE:
+            return None
+        if from_pile == BOTTOM_FACE_DOWN_PILE:
+            return self.piles[BOTTOM_FACE_DOWN_PILE][-1]
+        if TOP_PILE_1 <= from_pile <= TOP_PILE_4:
+            for p in range(TOP_PILE_1, TOP_PILE_4 + 1):
+                pile = self.piles[p]
+                if len(pile) > 0 and card_suit(pile[0].code) == from_pile - TOP_PILE_1:
+                    return pile[-1]
+            return None
+        return self.piles[from_pile][-count]
+
+    def make_engine_move(self, move):
+        """Carry out a move given as the engine gives it"""
+        from_pile, to_pile, count = move
+        if from_pile == BOTTOM_FACE_DOWN_PILE:
+            self.turn_over_cards()
+            # Cards turned over automatically are not fanned out
+            self.layout.waste_fan = 0
+            return
+        if to_pile == BOTTOM_FACE_DOWN_PILE:
+            self.turn_pack_over()
+            return
+        card = self.card_to_move(move)
+        pile = self.piles[self.get_pile_for_card(card)]
+        to_pile = self.screen_pile(to_pile, card)
+        for card in pile[len(pile) - count:]:
+            self.pull_to_top(card)
+            self.move_card_to_new_pile(card, to_pile)
+        # Turn over top card in pile moved from
+        if len(pile) > 0:
+            self.turn_face_up(pile[-1])
+
+    def make_safe_move(self):
+        """Move a card to a top pile if it can never be a mistake to do so
+        and return True if a card was moved"""
+        # Number of cards on the top pile of each suit
+        counts = [0] * 4
+        for p in range(TOP_PILE_1, TOP_PILE_4 + 1):
+            if len(self.piles[p]) > 0:
+                counts[card_suit(self.piles[p][0].code)] = len(self.piles[p])
+        for pile_index in [*range(PLAY_PILE_1, PLAY_PILE_7 + 1), BOTTOM_FACE_UP_PILE]:
+            pile = self.piles[pile_index]
+            if len(pile) > 0 and is_safe(pile[-1].code, counts):
+                card = pile[-1]
+                for p in range(TOP_PILE_1, TOP_PILE_4 + 1):
+                    if self.can_we_drop_here(card, p):
+                        self.pull_to_top(card)
+                        self.move_card_to_new_pile(card, p)
+                        if len(pile) > 0:
+                            self.turn_face_up(pile[-1])
+                        return True
+        return False
 
     def on_mouse_press(self, x, y, button, key_modifiers):
         """ Called when the user presses a mouse button. """
-        # Get list of cards we've clicked on
-        cards = arcade.get_sprites_at_point((x, y), self.card_list)
+        self.request_redraw()
+        # Work out the pile and card we've clicked on from the layout
+        hit = layout.pile_at(x, y, self.pile_sizes(), self.layout.waste_fan)
 
         # Have we clicked on a card?
-        if len(cards) > 0:
+        if hit is not None and hit[1] is not None:
 
-            # Might be a stack of cards, get the top one
-            primary_card = cards[-1]
-            # Figure out what pile the card is in
-            pile_index = self.get_pile_for_card(primary_card)
+            # The top card under the point and what pile it is in
+            pile_index, card_index = hit
+            primary_card = self.piles[pile_index][card_index]
 
             # Reset size of mat to no cards during move so does not display below the cards left
             top = self.pile_mat_list[pile_index].top
@@ -879,53 +1062,28 @@ class MyGame(arcade.Window):
                 # Flip the cards
                 # Clear undo data as can only undo last card movement action
                 self.undo.clear()
-                offset = 0
-                # Align existing cards in face_up_pile
-                count = len(self.piles[BOTTOM_FACE_UP_PILE])
-                if count > 0:
-                    for card in self.piles[BOTTOM_FACE_UP_PILE]:
-                        card.position = self.pile_mat_list[BOTTOM_FACE_UP_PILE].position
-                for i in range(self.cards_to_turn):
-                    # If we ran out of cards, stop
-                    if len(self.piles[BOTTOM_FACE_DOWN_PILE]) == 0:
-                        break
-                    # Get top card
-                    card = self.piles[BOTTOM_FACE_DOWN_PILE][-1]
-                    # Flip face up
-                    card.face_up()
-                    # Move card position to bottom-right face up pile
-                    card.position = self.pile_mat_list[BOTTOM_FACE_UP_PILE].position
-                    # Remove card from face down pile
-                    self.piles[BOTTOM_FACE_DOWN_PILE].remove(card)
-                    # Move card to face up list
-                    self.piles[BOTTOM_FACE_UP_PILE].append(card)
-                    # Put on top draw-order wise
-                    self.pull_to_top(card)
-                    card.center_x += offset
-                    offset += 20
+                # Existing cards in face_up_pile are aligned and the new cards fanned out
+                self.layout.waste_fan = self.turn_over_cards()
+                self.moves_made += 1
             elif primary_card.is_face_down:
                 # Is the card face down? In one of those middle 7 piles? Then flip up
                 # Clear undo data as can only undo last action
                 self.undo.clear()
 
-                primary_card.face_up()
+                self.turn_face_up(primary_card)
 
                 # Resize mat to height of card stack (probably not necessary)
-                self.resize_mat(pile_index)
+                self.layout.mark(pile_index)
             else:
                 # If face_up_pile then only take card if it is the top card
                 if pile_index == BOTTOM_FACE_UP_PILE:
                     if  self.piles[pile_index].index(primary_card) == len(self.piles[pile_index]) - 1:
                         self.held_cards = [primary_card]
-                        # Save the position
-                        self.held_cards_original_position = [self.held_cards[0].position]
                         # Put on top in drawing order
                         self.pull_to_top(self.held_cards[0])
                 else:
                     # All other cases, grab the face-up card we are clicking on
                     self.held_cards = [primary_card]
-                    # Save the position
-                    self.held_cards_original_position = [self.held_cards[0].position]
                     # Put on top in drawing order
                     self.pull_to_top(self.held_cards[0])
 
@@ -934,47 +1092,51 @@ class MyGame(arcade.Window):
                     for i in range(card_index + 1, len(self.piles[pile_index])):
                         card = self.piles[pile_index][i]
                         self.held_cards.append(card)
-                        self.held_cards_original_position.append(card.position)
                         self.pull_to_top(card)
         else:
 
             # Click on a mat instead of a card?
-            mats = arcade.get_sprites_at_point((x, y), self.pile_mat_list)
-
-            if len(mats) > 0:
-                mat = mats[0]
-                mat_index = self.pile_mat_list.index(mat)
+            if hit is not None:
+                mat_index = hit[0]
 
                 # Is it our turned over flip mat? and no cards on it?
                 if mat_index == BOTTOM_FACE_DOWN_PILE and len(self.piles[BOTTOM_FACE_DOWN_PILE]) == 0:
                     # Check if no cards have been moved since the last flip
                     if self.no_cards_moved:
-                        self.possibly_no_moves_timer = 60
+                        self.possibly_no_moves_end = time.monotonic() + MESSAGE_TIME
                     # Flip the deck back over so we can restart
-                    temp_list = self.piles[BOTTOM_FACE_UP_PILE].copy()
-                    for card in reversed(temp_list):
-                        card.face_down()
-                        self.piles[BOTTOM_FACE_UP_PILE].remove(card)
-                        self.piles[BOTTOM_FACE_DOWN_PILE].append(card)
-                        card.position = self.pile_mat_list[BOTTOM_FACE_DOWN_PILE].position
+                    self.turn_pack_over()
+                    self.moves_made += 1
                     # Flag that a card has not been moved since pack flipped
                     self.no_cards_moved = True
 
 
-    # Change mat size to size and position as stack of cards
-    # so mat only seen if no cards in pile
-    def resize_mat(self, pile_index):
-        # remember top position
-        top = self.pile_mat_list[pile_index].top
-        # if no cards in pile reset to card height
-        if len(self.piles[pile_index]) == 0:
-            self.pile_mat_list[pile_index].height = CARD_HEIGHT
-        else:
-            # resize height based on cards in pile
-            self.pile_mat_list[pile_index].height = self.piles[pile_index][-1].bottom - \
-                                                    top
-        # reset top card
-        self.pile_mat_list[pile_index].top = top
+    def turn_over_cards(self):
+        """Turn over the next one or three cards from the face down pile
+        and return the number turned over"""
+        count = 0
+        for i in range(self.cards_to_turn):
+            # If we ran out of cards, stop
+            if len(self.piles[BOTTOM_FACE_DOWN_PILE]) == 0:
+                break
+            # Get top card
+            card = self.piles[BOTTOM_FACE_DOWN_PILE][-1]
+            # Flip face up
+            card.face_up()
+            # Move card to face up list
+            self.move_card_to_new_pile(card, BOTTOM_FACE_UP_PILE)
+            # Put on top draw-order wise
+            self.pull_to_top(card)
+            count += 1
+        return count
+
+    def turn_pack_over(self):
+        """Turn the face up pile back over onto the face down pile"""
+        temp_list = self.piles[BOTTOM_FACE_UP_PILE].copy()
+        for card in reversed(temp_list):
+            card.face_down()
+            self.move_card_to_new_pile(card, BOTTOM_FACE_DOWN_PILE)
+        self.layout.waste_fan = 0
 
     def on_mouse_release(self, x: float, y: float, button: int,
                          modifiers: int):
@@ -983,23 +1145,21 @@ class MyGame(arcade.Window):
         # If we don't have any cards, who cares
         if len(self.held_cards) == 0:
             return
+        self.request_redraw()
 
-        # Find the closest pile, in case we are in contact with more than one
-        pile, distance = arcade.get_closest_sprite(self.held_cards[0], self.pile_mat_list)
-        reset_position = True
+        # What pile are we coming from
+        source_pile = self.get_pile_for_card(self.held_cards[0])
+        # The mat of the pile we came from is card sized while the cards are held
+        sizes = self.pile_sizes()
+        sizes[source_pile] = 0
 
-        source_pile = -1
+        # Find the closest pile we are in contact with, in case we are in contact with more than one
+        pile_index = layout.drop_pile(self.held_cards[0].center_x, self.held_cards[0].center_y, sizes)
 
-        # See if we are in contact with the closest pile
-        if arcade.check_for_collision(self.held_cards[0], pile):
-
-            # What pile is it?
-            pile_index = self.pile_mat_list.index(pile)
-            # What pile are we coming from
-            source_pile = self.get_pile_for_card(self.held_cards[0])
+        if pile_index is not None:
             #  Is it the same pile we came from?
             if pile_index == source_pile:
-                # If so, who cares. We'll just reset our position.
+                # If so, who cares. The layout will reset our position.
                 pass
             # Only action if it is legal to drop the cards
             elif self.can_we_drop_here(self.held_cards[0], pile_index):
@@ -1008,69 +1168,44 @@ class MyGame(arcade.Window):
 
                     self.store_undo(source_pile, pile_index)
 
-                    # Are there already cards there?
-                    if len(self.piles[pile_index]) > 0:
-                        # Move cards to proper position
-                        top_card = self.piles[pile_index][-1]
-                        for i, dropped_card in enumerate(self.held_cards):
-                            dropped_card.position = top_card.center_x, \
-                                top_card.center_y - CARD_VERTICAL_OFFSET * (i + 1)
-                    else:
-                        # Are there no cards in the middle play pile?
-                        for i, dropped_card in enumerate(self.held_cards):
-                            # Move cards to proper position
-                            dropped_card.position = pile.center_x, \
-                                pile.center_y - CARD_VERTICAL_OFFSET * i
-
                     for card in self.held_cards:
-                        # Cards are in the right position, but we need to move them to the right list
+                        # Move them to the right list, the layout will position them
                         self.move_card_to_new_pile(card, pile_index)
 
-                    # Success, don't reset position of cards
-                    reset_position = False
-
-                    self.resize_mat(pile_index)
-
                     # Flag that a card has been moved
                     self.no_cards_moved = False
+                    self.moves_made += 1
 
                 # Release on top play pile? And only one card held?
                 elif TOP_PILE_1 <= pile_index <= TOP_PILE_4 and len(self.held_cards) == 1:
                     # Only action if legal to drop the cards
                     if self.can_we_drop_here(self.held_cards[0], pile_index):
-                        # Move position of card to pile
-                        self.held_cards[0].position = pile.position
                         # Move card to card list
                         for card in self.held_cards:
                             self.undo.clear()
                             self.store_undo(source_pile, pile_index)
                             self.move_card_to_new_pile(card, pile_index)
 
-                        reset_position = False
-
                         # Flag that a card has been moved
                         self.no_cards_moved = False
+                        self.moves_made += 1
 
                         self.check_if_game_over()
 
-        if reset_position:
-            # Where-ever we were dropped, it wasn't valid. Reset each card's position
-            # to its original spot.
-            for pile_index, card in enumerate(self.held_cards):
-                card.position = self.held_cards_original_position[pile_index]
-
-        # Reset size of source pile in case cards moved
-        if source_pile != -1:
-            self.resize_mat(source_pile)
-            if len(self.piles[source_pile]) > 0:
-                self.piles[source_pile][-1].face_up()
-
         # We are no longer holding cards
         self.held_cards = []
 
+        # Where-ever we were dropped, if it wasn't valid the layout puts each card back
+        # to its original spot. Reset size of source pile in case cards moved
+        self.layout.mark(source_pile)
+        if len(self.piles[source_pile]) > 0:
+            self.turn_face_up(self.piles[source_pile][-1])
+
     def on_mouse_motion(self, x: float, y: float, dx: float, dy: float):
         """ User moves mouse """
         # If we are holding cards, move them with the mouse
+        if len(self.held_cards) > 0:
+            self.request_redraw()
         for card in self.held_cards:
             card.center_x += dx
             card.center_y += dy
@@ -1081,6 +1216,10 @@ class MyGame(arcade.Window):
         self.card_list.remove(card)
         self.card_list.append(card)
 
+    def pile_sizes(self):
+        """Number of cards in each pile"""
+        return [len(pile) for pile in self.piles]
+
     def get_pile_for_card(self, card):
         """ What pile is this card in? """
         for index, pile in enumerate(self.piles):
@@ -1095,13 +1234,40 @@ class MyGame(arcade.Window):
                 break
 
     def move_card_to_new_pile(self, card, pile_index):
-        """ Move the card to a new pile """
+        """ Move the card to a new pile and mark both piles to be laid out again """
+        from_pile = self.get_pile_for_card(card)
+        if from_pile == BOTTOM_FACE_UP_PILE:
+            # One less of the cards turned over is fanned out
+            self.layout.waste_fan = max(0, self.layout.waste_fan - 1)
+        if pile_index == BOTTOM_FACE_UP_PILE:
+            # Undo puts a card back on the fan
+            self.layout.waste_fan = min(self.layout.waste_fan + 1, self.cards_to_turn)
         self.remove_card_from_pile(card)
         self.piles[pile_index].append(card)
+        self.layout.mark(from_pile, pile_index)
+        self.journal.move(card.code, pile_index)
 
 def main():
     """ Main function """
+    parser = argparse.ArgumentParser(description=SCREEN_TITLE)
+    parser.add_argument("--startup-time", action="store_true",
+                        help="print how long the game takes to start")
+    parser.add_argument("--always-redraw", action="store_true",
+                        help="redraw every frame even when nothing is changing")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="trace memory from the start so T shows where it all goes")
+    args = parser.parse_args()
+    if args.trace_memory:
+        import memory_report
+        memory_report.start()
+    imported = time.perf_counter()
     window = MyGame()
+    window.render_on_demand = not args.always_redraw
+    if args.startup_time:
+        created = time.perf_counter()
+        print(f"Import {(imported - STARTUP_START) * 1000:.0f} ms - "
+              f"Window and first deal {(created - imported) * 1000:.0f} ms")
+        window.report_first_frame = True
     arcade.run()
 
 
@@ -0,0 +1,23 @@
+"""
+Card textures shared by the game and spectator windows.
+Textures are only loaded the first time they are used, so importing this
+does not load any images or open the window module.
+"""
+
+import arcade
+
+# Face down image
+FACE_DOWN_IMAGE = ":resources:images/cards/cardBack_red2.png"
+
+# Textures loaded so far keyed by file name.
+# Face textures are only loaded the first time a card is turned face up.
+textures = {}
+
+
+def get_texture(file_name):
+    """Load a texture the first time it is used and keep it"""
+    texture = textures.get(file_name)
+    if texture is None:
+        texture = arcade.load_texture(file_name)
+        textures[file_name] = texture
+    return texture
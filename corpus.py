@@ -0,0 +1,64 @@
+"""
+Winning deal files.
+Each line of a file is one deal: the 52 card names in the order they are
+dealt from, each followed by a comma, e.g. C5,HK,D10,...
+The files are only read the first time a deal is asked for.
+"""
+
+import random
+
+from engine import card_from_name, card_name
+
+# File of winning deals for each number of cards turned over
+DEAL_FILES = {1: "winning-deals-easy.txt", 3: "winning-deals-hard.txt"}
+
+# Deals loaded so far keyed by number of cards turned over
+_loaded = {}
+
+
+def parse_deal(line):
+    """List of cards in a line from a deal file.
+    Raises ValueError if the line is not a deal of 52 different cards."""
+    deal = [card_from_name(name) for name in line.strip().split(",") if name.strip() != ""]
+    if sorted(deal) != list(range(52)):
+        raise ValueError(f"A deal must contain each of the 52 cards once, found {len(deal)} card(s)")
+    return deal
+
+
+def format_deal(deal):
+    """Line for a deal file, without the newline"""
+    return "".join(card_name(card) + "," for card in deal)
+
+
+def winning_deals(cards_to_turn):
+    """List of the lines in the winning deal file for the mode, empty if it cannot be read.
+    The file is read once and then kept."""
+    if cards_to_turn not in _loaded:
+        try:
+            with open(DEAL_FILES[cards_to_turn], "r") as file:
+                _loaded[cards_to_turn] = [line for line in file if line.strip() != ""]
+        except OSError:
+            return []
+    return _loaded[cards_to_turn]
+
+
+def random_winning_deal(cards_to_turn):
+    """A random deal from the winning deal file for the mode or None if there are none"""
+    deals = winning_deals(cards_to_turn)
+    if len(deals) == 0:
+        return None
+    return parse_deal(random.choice(deals))
+
+
+def save_deal(deal, cards_to_turn):
+    """Add a deal to the winning deal file for the mode"""
+    save_deals([deal], cards_to_turn)
+
+
+def save_deals(deals, cards_to_turn):
+    """Add a list of deals to the winning deal file for the mode in one write"""
+    lines = [format_deal(deal) + "\n" for deal in deals]
+    with open(DEAL_FILES[cards_to_turn], "a") as file:
+        file.writelines(lines)
+    if cards_to_turn in _loaded:
+        _loaded[cards_to_turn].extend(lines)
@@ -0,0 +1,331 @@
+"""
+Headless Solitaire engine.
+The rules of the game without any graphics so that the game can be played,
+checked and solved by tools that do not open a window.
+This module must not import arcade or pyglet.
+
+Cards are held as integers 0 - 51: suit index * 13 + number - 1
+where the suit index is the position of the suit in CARD_SUITS.
+"""
+
+import hashlib
+
+# Card constants
+CARD_VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+CARD_SUITS = ["Clubs", "Hearts", "Spades", "Diamonds"]
+
+# Constants that represent "what pile is what" for the game
+PILE_COUNT = 13
+BOTTOM_FACE_DOWN_PILE = 0
+BOTTOM_FACE_UP_PILE = 1
+PLAY_PILE_1 = 2
+PLAY_PILE_2 = 3
+PLAY_PILE_3 = 4
+PLAY_PILE_4 = 5
+PLAY_PILE_5 = 6
+PLAY_PILE_6 = 7
+PLAY_PILE_7 = 8
+TOP_PILE_1 = 9
+TOP_PILE_2 = 10
+TOP_PILE_3 = 11
+TOP_PILE_4 = 12
+
+PLAY_PILES = range(PLAY_PILE_1, PLAY_PILE_7 + 1)
+TOP_PILES = range(TOP_PILE_1, TOP_PILE_4 + 1)
+
+
+def card_suit(card):
+    """Suit index of a card"""
+    return card // 13
+
+
+def card_number(card):
+    """Number of a card 1 (ace) - 13 (king)"""
+    return card % 13 + 1
+
+
+def is_red(card):
+    """Hearts and Diamonds are red"""
+    return card // 13 in (1, 3)
+
+
+def card_from_name(name):
+    """Card from its name in a deal file e.g. 'H10' is the ten of hearts.
+    Raises ValueError if the name is not a card."""
+    suits = [suit[0] for suit in CARD_SUITS]
+    if len(name) < 2 or name[0] not in suits or name[1:] not in CARD_VALUES:
+        raise ValueError(f"Not a card: {name!r}")
+    return suits.index(name[0]) * 13 + CARD_VALUES.index(name[1:])
+
+
+def card_name(card):
+    """Name of a card as used in the deal files"""
+    return f"{CARD_SUITS[card_suit(card)][0]}{CARD_VALUES[card % 13]}"
+
+
+def is_safe(card, foundation_counts):
+    """True if a card that can go on its top pile is not needed to hold other cards
+    in the play piles, so it is worth moving it there before anything else.
+    Aces and twos are always safe. Other cards are safe once both cards of the
+    opposite colour one lower are on the top piles, as nothing else can go on them
+    unless it is first moved back down from a top pile.
+    foundation_counts is the number of cards on the top pile of each suit."""
+    number = card_number(card)
+    if number <= 2:
+        return True
+    opposite = (0, 2) if is_red(card) else (1, 3)
+    return all(foundation_counts[suit] >= number - 1 for suit in opposite)
+
+
+class Game():
+    """The state of one game.
+    piles uses the same pile numbers as the window. The top piles are
+    fixed by suit: TOP_PILE_1 + suit index.
+    face_down holds the number of face down cards at the bottom of each play pile.
+    A move is a tuple (from_pile, to_pile, number of cards).
+    Turning cards from the face down pile is (BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE, n)
+    and turning the face up pile back over is (BOTTOM_FACE_UP_PILE, BOTTOM_FACE_DOWN_PILE, n)."""
+
+    def __init__(self, deal, cards_to_turn=1):
+        """deal is a list of 52 cards in the order they are dealt from,
+        as saved in the winning deal files"""
+        if sorted(deal) != list(range(52)):
+            raise ValueError("A deal must contain each of the 52 cards once")
+        self.deal = list(deal)
+        self.cards_to_turn = cards_to_turn
+        self.piles = [[] for _ in range(PILE_COUNT)]
+        self.face_down = [0] * PILE_COUNT
+        # Moves made with whether a card was turned face up by the move
+        self.history = []
+        # Deal in the same way as the window. Cards are popped from the end of the deck.
+        self.piles[BOTTOM_FACE_DOWN_PILE] = list(deal)
+        for pile_no in PLAY_PILES:
+            for j in range(pile_no - PLAY_PILE_1 + 1):
+                self.piles[pile_no].append(self.piles[BOTTOM_FACE_DOWN_PILE].pop())
+            self.face_down[pile_no] = len(self.piles[pile_no]) - 1
+
+    def copy(self):
+        """A copy of the game without its history"""
+        game = Game.__new__(Game)
+        game.deal = self.deal
+        game.cards_to_turn = self.cards_to_turn
+        game.piles = [pile.copy() for pile in self.piles]
+        game.face_down = self.face_down.copy()
+        game.history = []
+        return game
+
+    def foundation_count(self):
+        """Number of cards on the top piles"""
+        return sum(len(self.piles[p]) for p in TOP_PILES)
+
+    def is_won(self):
+        """All cards are on the top piles"""
+        return self.foundation_count() == 52
+
+    def can_drop(self, card, pile_index):
+        """Check the rules to see if we can drop the card on the pile"""
+        pile = self.piles[pile_index]
+        if TOP_PILE_1 <= pile_index <= TOP_PILE_4:
+            if card_suit(card) != pile_index - TOP_PILE_1:
+                return False
+            return card_number(card) == len(pile) + 1
+        if len(pile) == 0:
+            return card_number(card) == 13
+        top = pile[-1]
+        return card_number(card) == card_number(top) - 1 and is_red(card) != is_red(top)
+
+    def foundation_for(self, card):
+        """The top pile a card goes to"""
+        return TOP_PILE_1 + card_suit(card)
+
+    def safe_move(self):
+        """A move of a play pile or face up pile card to a top pile that is_safe(),
+        or None if there is not one"""
+        counts = [len(self.piles[pile_index]) for pile_index in TOP_PILES]
+        for pile_index in (*PLAY_PILES, BOTTOM_FACE_UP_PILE):
+            pile = self.piles[pile_index]
+            if len(pile) > 0:
+                card = pile[-1]
+                if card_number(card) == counts[card_suit(card)] + 1 and is_safe(card, counts):
+                    return pile_index, self.foundation_for(card), 1
+        return None
+
+    def is_pointless(self, move):
+        """True for moves between play piles that can never help.
+        Moving part of a face up stack onto another pile only swaps which of two alike
+        cards is showing, so it is only worth it if the card left showing can then
+        go on its top pile. Moving a king from the base of a pile is already not a legal move."""
+        from_pile, to_pile, count = move
+        if not (PLAY_PILE_1 <= from_pile <= PLAY_PILE_7 and PLAY_PILE_1 <= to_pile <= PLAY_PILE_7):
+            return False
+        pile = self.piles[from_pile]
+        below = len(pile) - count - 1
+        if below < self.face_down[from_pile]:
+            # Turns over a card or empties the pile
+            return False
+        return not self.can_drop(pile[below], self.foundation_for(pile[below]))
+
+    def useful_moves(self):
+        """The moves worth searching from this position. If there is a safe move
+        from a play pile it is the only move, otherwise the legal moves that are not pointless.
+        A safe move from the face up pile is not the only move as, with 3 cards turned
+        over, playing it changes which cards in the pack can be reached."""
+        move = self.safe_move()
+        if move is not None and move[0] != BOTTOM_FACE_UP_PILE:
+            return [move]
+        return [move for move in self.legal_moves() if not self.is_pointless(move)]
+
+    def legal_moves(self):
+        """All legal moves, most useful first"""
+        moves = []
+        piles = self.piles
+        waste = piles[BOTTOM_FACE_UP_PILE]
+        # Moves to the top piles
+        for pile_index in PLAY_PILES:
+            pile = piles[pile_index]
+            if pile and self.can_drop(pile[-1], self.foundation_for(pile[-1])):
+                moves.append((pile_index, self.foundation_for(pile[-1]), 1))
+        if waste and self.can_drop(waste[-1], self.foundation_for(waste[-1])):
+            moves.append((BOTTOM_FACE_UP_PILE, self.foundation_for(waste[-1]), 1))
+        # Moves between play piles
+        for pile_index in PLAY_PILES:
+            pile = piles[pile_index]
+            for i in range(self.face_down[pile_index], len(pile)):
+                if i == 0 and card_number(pile[i]) == 13:
+                    # Don't move a king that is already at the base of a pile
+                    continue
+                for to_pile in PLAY_PILES:
+                    if to_pile != pile_index and self.can_drop(pile[i], to_pile):
+                        moves.append((pile_index, to_pile, len(pile) - i))
+        # Face up pile to a play pile
+        if waste:
+            for to_pile in PLAY_PILES:
+                if self.can_drop(waste[-1], to_pile):
+                    moves.append((BOTTOM_FACE_UP_PILE, to_pile, 1))
+        # Turn over cards or turn the pack back over
+        if piles[BOTTOM_FACE_DOWN_PILE]:
+            moves.append((BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE,
+                          min(self.cards_to_turn, len(piles[BOTTOM_FACE_DOWN_PILE]))))
+        elif waste:
+            moves.append((BOTTOM_FACE_UP_PILE, BOTTOM_FACE_DOWN_PILE, len(waste)))
+        # Back down from a top pile
+        for pile_index in TOP_PILES:
+            pile = piles[pile_index]
+            if pile:
+                for to_pile in PLAY_PILES:
+                    if self.can_drop(pile[-1], to_pile):
+                        moves.append((pile_index, to_pile, 1))
+        return moves
+
+    def stock_index(self):
+        """The cards in the face down and face up piles that can be brought to the top of the
+        face up pile by turning cards over, on this pass through the pack and the next.
+        With 3 cards turned over only every third card can be reached and which ones
+        changes as cards leave the face up pile, so the index is worked out from the piles.
+        Returns a list of (card, number of moves turning cards over to reach it), fewest moves first.
+        The card already on top of the face up pile is not included."""
+        stock = self.piles[BOTTOM_FACE_DOWN_PILE]
+        waste = self.piles[BOTTOM_FACE_UP_PILE]
+        size = len(stock) + len(waste)
+        index = []
+        # Position of each card reached in the pack, in the order cards are turned over
+        reached = {len(waste) - 1}
+        turns = 0
+        for next_pass in (False, True):
+            if next_pass:
+                if size == 0:
+                    break
+                # Turn the pack back over for the next pass
+                turns += 1
+            position = -1 if next_pass else len(waste) - 1
+            while position < size - 1:
+                position = min(position + self.cards_to_turn, size - 1)
+                turns += 1
+                if position not in reached:
+                    reached.add(position)
+                    card = waste[position] if position < len(waste) else stock[size - 1 - position]
+                    index.append((card, turns))
+        return index
+
+    def turn_moves(self, turns):
+        """The first number of moves that turn cards over or turn the pack back over from here"""
+        stock = len(self.piles[BOTTOM_FACE_DOWN_PILE])
+        waste = len(self.piles[BOTTOM_FACE_UP_PILE])
+        moves = []
+        while len(moves) < turns:
+            if stock == 0:
+                moves.append((BOTTOM_FACE_UP_PILE, BOTTOM_FACE_DOWN_PILE, waste))
+                stock, waste = waste, 0
+            else:
+                count = min(self.cards_to_turn, stock)
+                moves.append((BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE, count))
+                stock -= count
+                waste += count
+        return moves
+
+    def stock_moves(self):
+        """Each way of playing a card from the stock_index(), as the moves that turn cards
+        over to reach it followed by the move of the card to a top pile or play pile"""
+        moves = []
+        for card, turns in self.stock_index():
+            for to_pile in (self.foundation_for(card), *PLAY_PILES):
+                if self.can_drop(card, to_pile):
+                    moves.append(self.turn_moves(turns) + [(BOTTOM_FACE_UP_PILE, to_pile, 1)])
+        return moves
+
+    def apply(self, move):
+        """Make a move. The move is not checked so must come from legal_moves()"""
+        from_pile, to_pile, count = move
+        source = self.piles[from_pile]
+        dest = self.piles[to_pile]
+        if from_pile == BOTTOM_FACE_DOWN_PILE or to_pile == BOTTOM_FACE_DOWN_PILE:
+            # Cards are turned over one at a time so their order is reversed
+            for _ in range(count):
+                dest.append(source.pop())
+            self.history.append((move, False))
+            return
+        dest.extend(source[-count:])
+        del source[-count:]
+        # Turn over the top card of a play pile when all face up cards are moved from it
+        flipped = False
+        if PLAY_PILE_1 <= from_pile <= PLAY_PILE_7 and self.face_down[from_pile] == len(source) > 0:
+            self.face_down[from_pile] -= 1
+            flipped = True
+        self.history.append((move, flipped))
+
+    def undo(self):
+        """Take back the last move"""
+        (from_pile, to_pile, count), flipped = self.history.pop()
+        source = self.piles[from_pile]
+        dest = self.piles[to_pile]
+        if flipped:
+            self.face_down[from_pile] += 1
+        if from_pile == BOTTOM_FACE_DOWN_PILE or to_pile == BOTTOM_FACE_DOWN_PILE:
+            for _ in range(count):
+                source.append(dest.pop())
+            return
+        source.extend(dest[-count:])
+        del dest[-count:]
+
+    def state_key(self):
+        """Bytes that identify the position. The order of the play piles does not
+        matter and the top piles hold the cards that are nowhere else so neither is included."""
+        tableau = sorted(bytes((self.face_down[p],)) + bytes(self.piles[p]) for p in PLAY_PILES)
+        return b"\xff".join([bytes(self.piles[BOTTOM_FACE_DOWN_PILE]),
+                             bytes(self.piles[BOTTOM_FACE_UP_PILE])] + tableau)
+
+    def state_hash(self):
+        """64 bit hash of state_key() that is the same in every process"""
+        return int.from_bytes(hashlib.blake2b(self.state_key(), digest_size=8).digest(), "little")
+
+    def position_hash(self):
+        """64 bit hash of the position with the play piles in the order they are in, so a move
+        kept for one position can be made as it is in another with the same hash"""
+        piles = [bytes((self.face_down[p],)) + bytes(self.piles[p]) for p in PLAY_PILES]
+        key = b"\xff".join([bytes(self.piles[BOTTOM_FACE_DOWN_PILE]), bytes(self.piles[BOTTOM_FACE_UP_PILE])] + piles)
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+    def deal_id(self):
+        """64 bit hash of the deal and the number of cards turned over that is the same in every process"""
+        return int.from_bytes(hashlib.blake2b(bytes(self.deal + [self.cards_to_turn]), digest_size=8).digest(),
+                              "little")
@@ -0,0 +1,204 @@
+"""
+Find winning deals without opening a window.
+Random deals are played by the same greedy player as pressing G in the
+game, spread over all the cores of the machine. Every game played is
+written to the statistics file in batches and the winning deals are added
+to the winning deal file for the mode as soon as they are found.
+With --search the deals the greedy player loses are searched for a win,
+after the cheap checks in prefilter.py have thrown out those they can.
+
+The deals are handed out by stream_results() and stream_winning_deals(),
+or their async versions, which other code can use to take winning deals
+as they are found without going through the deal files. Only a few tasks
+are given to the workers at a time and more only once results are taken,
+so a consumer that falls behind holds the workers back rather than
+results piling up.
+
+    python generator.py --mode 3 --wins 100
+    python generator.py --mode 3 --wins 100 --search
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import os
+import random
+import time
+
+import corpus
+import prefilter
+import solver
+import stats
+from engine import Game
+from transposition import TranspositionTable
+
+# Number of winning deals to find, the same as pressing G in the game
+NUMBER_WINNING_DEALS = 100
+
+# Games played between progress reports
+BATCH_GAMES = 1000
+# Games played between progress reports when searching, as each takes much longer
+SEARCH_BATCH_GAMES = 100
+
+# Deals played by a worker in one task. Many when only the greedy player is used
+# as each takes a few milliseconds, so the cost of handing out the task is shared.
+GREEDY_CHUNK = 50
+SEARCH_CHUNK = 1
+
+# Tasks given to the workers at a time for each worker
+IN_FLIGHT_PER_WORKER = 2
+
+# Memory for the positions remembered by each process when searching
+TABLE_BYTES = 16 * 1024 * 1024
+
+# Table used by all the searches in a worker process, made when first needed
+table = None
+
+
+def play_random_deal(task):
+    """Put one random deal through the stages of prefilter.py.
+    A win is checked by playing its moves again from the deal.
+    Returns (deal, status, moves in the win, seconds taken, time in each stage)."""
+    global table
+    cards_to_turn, seed, stages, max_nodes = task
+    deal = list(range(52))
+    random.Random(seed).shuffle(deal)
+    if table is None and stages != ("greedy",):
+        table = TranspositionTable(TABLE_BYTES)
+    start = time.perf_counter()
+    status, moves, times = prefilter.run_stages(Game(deal, cards_to_turn), stages, max_nodes=max_nodes, table=table)
+    if status == solver.SOLVED:
+        game = Game(deal, cards_to_turn)
+        for move in moves:
+            game.apply(move)
+        if not game.is_won():
+            status = solver.UNKNOWN
+    return deal, status, len(moves or []), time.perf_counter() - start, times
+
+
+def play_random_deals(tasks):
+    """Play a list of deals in a worker, returning the result of play_random_deal() for each"""
+    return [play_random_deal(task) for task in tasks]
+
+
+def make_tasks(cards_to_turn, stages, max_nodes, seeds):
+    """The next task for a worker, a list of deals with seeds taken from a random.Random"""
+    chunk = GREEDY_CHUNK if stages == ("greedy",) else SEARCH_CHUNK
+    return [(cards_to_turn, seeds.getrandbits(64), stages, max_nodes) for _ in range(chunk)]
+
+
+def stream_results(cards_to_turn, stages=("greedy",), max_nodes=solver.DEFAULT_MAX_NODES, seed=None,
+                   executor=None, workers=None, in_flight=None):
+    """Yield the result of play_random_deal() for random deals, for ever, as the workers finish them.
+    Deals come in the order they are finished so may not be the same from run to run with a seed.
+    Uses executor if given, else a process pool of its own that is shut down when the stream is closed.
+    No more than in_flight tasks are given out at a time, by default two for each worker."""
+    seeds = random.Random(seed)
+    workers = workers or os.cpu_count()
+    in_flight = in_flight or workers * IN_FLIGHT_PER_WORKER
+    pool = executor or concurrent.futures.ProcessPoolExecutor(workers)
+    pending = set()
+    try:
+        while True:
+            while len(pending) < in_flight:
+                pending.add(pool.submit(play_random_deals, make_tasks(cards_to_turn, stages, max_nodes, seeds)))
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+
+
+def stream_winning_deals(cards_to_turn, **kwargs):
+    """Yield winning deals for the mode as they are found, taking the same arguments as stream_results()"""
+    for deal, status, moves, seconds, times in stream_results(cards_to_turn, **kwargs):
+        if status == solver.SOLVED:
+            yield deal
+
+
+async def astream_results(cards_to_turn, executor, stages=("greedy",), max_nodes=solver.DEFAULT_MAX_NODES,
+                          seed=None, in_flight=2):
+    """Async version of stream_results() using an executor that is not shut down.
+    Waiting for a result never holds up the event loop."""
+    loop = asyncio.get_running_loop()
+    seeds = random.Random(seed)
+    pending = set()
+    try:
+        while True:
+            while len(pending) < in_flight:
+                pending.add(loop.run_in_executor(executor, play_random_deals,
+                                                 make_tasks(cards_to_turn, stages, max_nodes, seeds)))
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                for result in future.result():
+                    yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def astream_winning_deals(cards_to_turn, executor, **kwargs):
+    """Async version of stream_winning_deals()"""
+    async for deal, status, moves, seconds, times in astream_results(cards_to_turn, executor, **kwargs):
+        if status == solver.SOLVED:
+            yield deal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play random deals and save the winning ones")
+    parser.add_argument("--mode", type=int, choices=[1, 3], default=1, help="cards turned over at a time")
+    parser.add_argument("--wins", type=int, default=NUMBER_WINNING_DEALS, help="number of winning deals to find")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes to use")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the deals, random if not given")
+    parser.add_argument("--db", default=stats.DEFAULT_DB, help="statistics file")
+    parser.add_argument("--no-save", action="store_true", help="do not add the winning deals to the deal file")
+    parser.add_argument("--search", action="store_true", help="search the deals the greedy player loses")
+    parser.add_argument("--no-prefilter", action="store_true", help="search without the cheap checks first")
+    parser.add_argument("--max-nodes", type=int, default=solver.DEFAULT_MAX_NODES,
+                        help="positions to search before giving up on a deal")
+    args = parser.parse_args()
+    if not args.search:
+        stages = ("greedy",)
+    elif args.no_prefilter:
+        stages = ("greedy", "search")
+    else:
+        stages = prefilter.STAGES
+    report = prefilter.Report(stages)
+    batch = BATCH_GAMES if stages == ("greedy",) else SEARCH_BATCH_GAMES
+
+    store = stats.StatsStore(args.db)
+    start = time.perf_counter()
+    games = 0
+    games_won = 0
+    results = stream_results(args.mode, stages, args.max_nodes, args.seed, workers=args.workers)
+    for deal, status, moves, seconds, times in results:
+        report.add(status, times)
+        won = status == solver.SOLVED
+        games += 1
+        games_won += won
+        # Without --search a deal is lost when the greedy player loses it, as when G is pressed in the game.
+        # A deal the search gave up on is not known to be won or lost so is left out of the statistics.
+        if won or status == solver.UNSOLVABLE or not args.search:
+            store.record_game(corpus.format_deal(deal), args.mode, stats.GENERATOR,
+                              stats.WON if won else stats.LOST, moves, seconds)
+        if won and not args.no_save:
+            # Saved straight away so nothing found is lost if the run is stopped
+            corpus.save_deal(deal, args.mode)
+        if games % batch == 0:
+            print(f"Games played {games} - Games won {games_won}")
+        if games_won >= args.wins:
+            break
+    # Stop the workers on the deals still being played
+    results.close()
+    store.close()
+    print(f"Games {games} of which {games_won} were winning deals in {time.perf_counter() - start:.1f} seconds")
+    report.print()
+    games_counted, rate = store.win_rate(args.mode)
+    print(f"Percent winning {rate * 100:.1f} over the last {games_counted} generated games")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+The game being played kept on disk so it can be carried on after the window
+closes or crashes. The file starts with a snapshot of every pile and then has
+one short line for each card moved or turned over. Lines are buffered and only
+forced to the disk every second, so a move costs a few microseconds and a crash
+loses at most the last second of play. Every so often the lines are folded back
+into a new snapshot so reading the game back stays fast. The journal is removed
+when the game ends.
+
+    python journal.py                   show the game that will be carried on
+    python journal.py --time 100000     time writing card moves to the journal
+
+Lines, with cards named as in the deal files and piles numbered as in the engine:
+    S mode winning moves deal pile0 ... pile12      snapshot, face down cards start with -
+    M card pile                                     card moved to the top of a pile
+    U card                                          card turned face up
+    D card                                          card turned face down
+    C mode                                          number of cards turned over changed
+    N moves                                         number of moves made so far
+"""
+
+import argparse
+import atexit
+import os
+import time
+
+from engine import (PILE_COUNT, BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE, TOP_PILE_1, TOP_PILE_4,
+                    card_from_name, card_name)
+
+DEFAULT_JOURNAL = "solitaire-journal.txt"
+
+# Longest time in seconds a line waits before it is forced to the disk
+SYNC_INTERVAL = 1.0
+
+# Lines written before they are folded into a new snapshot
+COMPACT_EVERY = 500
+
+
+class SavedGame():
+    """Where every card is in a game, as kept in the journal"""
+
+    def __init__(self, cards_to_turn, winning, deal, piles, face_down, moves_made=0):
+        self.cards_to_turn = cards_to_turn
+        # True if the deal came from the winning deal file so is not saved again if won
+        self.winning = winning
+        # The deal as a list of engine cards
+        self.deal = deal
+        # Engine cards in each pile from the bottom up
+        self.piles = piles
+        # Set of the cards that are face down
+        self.face_down = face_down
+        self.moves_made = moves_made
+        # Pile each card is in
+        self.where = {card: pile_index for pile_index, pile in enumerate(piles) for card in pile}
+
+    def move(self, card, pile_index):
+        """Move a card to the top of a pile. Cards on the face up and top piles are
+        always face up and cards on the face down pile always face down."""
+        self.piles[self.where[card]].remove(card)
+        self.piles[pile_index].append(card)
+        self.where[card] = pile_index
+        if pile_index == BOTTOM_FACE_DOWN_PILE:
+            self.face_down.add(card)
+        elif pile_index == BOTTOM_FACE_UP_PILE or TOP_PILE_1 <= pile_index <= TOP_PILE_4:
+            self.face_down.discard(card)
+
+    def apply(self, line):
+        """Carry out one line of the journal. Raises ValueError if it is not a whole line."""
+        parts = line.split()
+        if parts[0] == "M" and len(parts) == 3 and 0 <= int(parts[2]) < PILE_COUNT:
+            self.move(card_from_name(parts[1]), int(parts[2]))
+        elif parts[0] == "U" and len(parts) == 2:
+            self.face_down.discard(card_from_name(parts[1]))
+        elif parts[0] == "D" and len(parts) == 2:
+            self.face_down.add(card_from_name(parts[1]))
+        elif parts[0] == "C" and len(parts) == 2 and parts[1] in ("1", "3"):
+            self.cards_to_turn = int(parts[1])
+        elif parts[0] == "N" and len(parts) == 2:
+            self.moves_made = int(parts[1])
+        else:
+            raise ValueError(f"Not a journal line: {line!r}")
+
+    def snapshot(self):
+        """The snapshot line for the game"""
+        piles = []
+        for pile in self.piles:
+            names = [("-" if card in self.face_down else "") + card_name(card) for card in pile]
+            piles.append(",".join(names) if len(names) > 0 else ".")
+        deal = ",".join(card_name(card) for card in self.deal)
+        return f"S {self.cards_to_turn} {int(self.winning)} {self.moves_made} {deal} {' '.join(piles)}\n"
+
+
+def parse_snapshot(line):
+    """The game in a snapshot line. Raises ValueError if it is not a whole snapshot."""
+    parts = line.split()
+    if len(parts) != 5 + PILE_COUNT or parts[0] != "S" or parts[1] not in ("1", "3"):
+        raise ValueError("Not a snapshot")
+    deal = [card_from_name(name) for name in parts[4].split(",")]
+    piles = []
+    face_down = set()
+    for text in parts[5:]:
+        pile = []
+        for name in text.split(",") if text != "." else []:
+            card = card_from_name(name.lstrip("-"))
+            if name.startswith("-"):
+                face_down.add(card)
+            pile.append(card)
+        piles.append(pile)
+    if sorted(deal) != list(range(52)) or sorted(card for pile in piles for card in pile) != list(range(52)):
+        raise ValueError("A snapshot must contain each of the 52 cards once")
+    return SavedGame(int(parts[1]), parts[2] == "1", deal, piles, face_down, int(parts[3]))
+
+
+def sync_directory(path):
+    """Force the folder holding a file to the disk so a rename of the file is kept after a crash.
+    Folders cannot be opened this way on Windows, where there is nothing to do."""
+    try:
+        descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+
+
+def read_journal(path=DEFAULT_JOURNAL):
+    """The game in a journal file with every line carried out, or None if there is no game.
+    A line cut short by a crash and anything after it is ignored."""
+    try:
+        with open(path, "r") as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+    try:
+        game = parse_snapshot(lines[0])
+    except (IndexError, ValueError):
+        return None
+    for line in lines[1:]:
+        if not line.endswith("\n"):
+            break
+        if line.strip() == "":
+            continue
+        try:
+            game.apply(line)
+        except (IndexError, KeyError, ValueError):
+            break
+    return game
+
+
+class Journal():
+    """Append only record of the game being played"""
+
+    def __init__(self, path=DEFAULT_JOURNAL, sync_interval=SYNC_INTERVAL, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.compact_every = compact_every
+        # Copy of the game kept up to date by each line, so a snapshot can be taken at any time.
+        # None when no game is being played.
+        self.game = None
+        self.file = None
+        # Lines written since the last snapshot
+        self.lines = 0
+        # Set when lines have been written that are not yet forced to the disk
+        self.dirty = False
+        self.last_sync = time.monotonic()
+        atexit.register(self.close)
+
+    def load(self):
+        """The game left in the journal, or None, which carries on being recorded"""
+        game = read_journal(self.path)
+        if game is not None:
+            # The only time the journal is compacted outside tick()
+            self.game = game
+            self.compact()
+        return game
+
+    def start(self, game):
+        """Start recording a new game from a SavedGame.
+        The snapshot is forced to the disk by tick() like any other line, so dealing does not wait for the disk."""
+        self.game = game
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, "w", buffering=64 * 1024)
+        self.file.write(game.snapshot())
+        self.lines = 0
+        self.dirty = True
+
+    def compact(self):
+        """Replace the journal with a snapshot of the game.
+        The snapshot is written to another file first so a crash leaves the old or the new journal."""
+        if self.file is not None:
+            self.file.close()
+        temp = self.path + ".tmp"
+        with open(temp, "w") as file:
+            file.write(self.game.snapshot())
+            # On the disk before it is renamed, or a crash could leave an empty journal
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, self.path)
+        sync_directory(self.path)
+        # Buffered so each line is a copy into memory, forced to the disk by tick()
+        self.file = open(self.path, "a", buffering=64 * 1024)
+        self.lines = 0
+        self.dirty = True
+
+    def write(self, line):
+        """Add a line for a game being recorded"""
+        if self.game is None:
+            return
+        self.game.apply(line)
+        self.file.write(line)
+        self.lines += 1
+        self.dirty = True
+
+    def move(self, card, pile_index):
+        self.write(f"M {card_name(card)} {pile_index}\n")
+
+    def face_up(self, card):
+        self.write(f"U {card_name(card)}\n")
+
+    def face_down(self, card):
+        self.write(f"D {card_name(card)}\n")
+
+    def mode(self, cards_to_turn):
+        self.write(f"C {cards_to_turn}\n")
+
+    def tick(self, moves_made):
+        """Called each frame. Notes the number of moves made if it has changed,
+        forces the lines to the disk once a second and
+        takes a new snapshot once enough lines have been written."""
+        if self.game is None:
+            return
+        if moves_made != self.game.moves_made:
+            self.write(f"N {moves_made}\n")
+        if self.lines >= self.compact_every:
+            self.compact()
+        if self.dirty and time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Force every line written to the disk"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.dirty = False
+        self.last_sync = time.monotonic()
+
+    def clear(self):
+        """The game has ended so there is nothing to carry on"""
+        self.game = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Write out anything buffered, leaving the game to be carried on"""
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the game kept in the journal")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL, help="journal file")
+    parser.add_argument("--time", type=int, default=0, metavar="MOVES",
+                        help="time writing this many card moves to a journal in a temporary file")
+    args = parser.parse_args()
+    if args.time:
+        deal = list(range(52))
+        piles = [deal[:24], deal[24:]] + [[] for _ in range(PILE_COUNT - 2)]
+        journal = Journal(args.journal + ".time", compact_every=args.time + 1)
+        journal.start(SavedGame(1, False, deal, piles, set(deal[:24])))
+        start = time.perf_counter()
+        for i in range(args.time):
+            journal.move(i % 24, BOTTOM_FACE_UP_PILE if i % 2 == 0 else BOTTOM_FACE_DOWN_PILE)
+            journal.tick(i)
+        elapsed = time.perf_counter() - start
+        journal.clear()
+        print(f"{args.time} moves in {elapsed:.3f} seconds - {elapsed / args.time * 1e6:.1f} microseconds a move")
+        return
+    game = read_journal(args.journal)
+    if game is None:
+        print(f"No game in {args.journal}")
+        return
+    print(f"Cards turned over {game.cards_to_turn} - moves made {game.moves_made} - "
+          f"{'winning' if game.winning else 'random'} deal")
+    for pile_index, pile in enumerate(game.piles):
+        print(f"  {pile_index:2}: {' '.join(('-' if card in game.face_down else '') + card_name(card) for card in pile)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Where the piles and cards are on the screen.
+The piles are laid out on a fixed grid so the pile and card under a point
+can be worked out with arithmetic rather than testing every sprite.
+This module must not import arcade so it can be used to simulate clicks
+without opening a window.
+"""
+
+import math
+
+from engine import (PILE_COUNT, BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE, PLAY_PILE_1, PLAY_PILE_7,
+                    TOP_PILE_1, TOP_PILE_4)
+
+# Screen size
+SCREEN_WIDTH = 660
+SCREEN_HEIGHT = 768
+
+# Constants for sizing
+CARD_SCALE = 0.6
+
+# How big are the cards?
+CARD_WIDTH = 140 * CARD_SCALE
+CARD_HEIGHT = 190 * CARD_SCALE
+
+# How big is the mat we'll place the card on?
+# We will change the size of the mat as cards
+# are moved so mat is not normally visible
+MAT_HEIGHT = int(CARD_HEIGHT)
+MAT_WIDTH = int(CARD_WIDTH)
+
+# How much space do we leave as a gap between the mats?
+# Done as a percent of the mat size.
+VERTICAL_MARGIN_PERCENT = 0.10
+HORIZONTAL_MARGIN_PERCENT = 0.10
+
+# The Y of the bottom row (2 piles)
+BOTTOM_Y = MAT_HEIGHT / 2 + MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
+
+# The X of where to start putting things on the left side
+START_X = MAT_WIDTH / 2 + MAT_WIDTH * HORIZONTAL_MARGIN_PERCENT
+
+# The Y of the top row (4 piles)
+TOP_Y = SCREEN_HEIGHT - MAT_HEIGHT / 2 - MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
+
+# The Y of the middle row (7 piles)
+MIDDLE_Y = TOP_Y - MAT_HEIGHT - MAT_HEIGHT * VERTICAL_MARGIN_PERCENT
+
+# How far apart each pile goes
+X_SPACING = MAT_WIDTH + MAT_WIDTH * HORIZONTAL_MARGIN_PERCENT
+
+# If we fan out cards stacked on each other, how far apart to fan them?
+CARD_VERTICAL_OFFSET = CARD_HEIGHT * CARD_SCALE * 0.3
+
+# How far apart the cards just turned over are fanned out on the face up pile
+WASTE_FAN_OFFSET = 20
+
+# Rows of piles from the top of the screen: (y, first pile, number of piles)
+ROWS = [(TOP_Y, TOP_PILE_1, TOP_PILE_4 - TOP_PILE_1 + 1),
+        (MIDDLE_Y, PLAY_PILE_1, PLAY_PILE_7 - PLAY_PILE_1 + 1),
+        (BOTTOM_Y, BOTTOM_FACE_DOWN_PILE, 2)]
+
+
+def pile_position(pile_index):
+    """Centre of the mat for a pile"""
+    for y, first, count in ROWS:
+        if first <= pile_index < first + count:
+            return START_X + (pile_index - first) * X_SPACING, y
+    raise ValueError(f"No pile {pile_index}")
+
+
+def card_position(pile_index, card_index, pile_size, waste_fan=0):
+    """Centre of a card in a pile.
+    waste_fan is the number of cards at the top of the face up pile that are fanned out."""
+    x, y = pile_position(pile_index)
+    if PLAY_PILE_1 <= pile_index <= PLAY_PILE_7:
+        return x, y - CARD_VERTICAL_OFFSET * card_index
+    if pile_index == BOTTOM_FACE_UP_PILE and card_index >= pile_size - waste_fan:
+        return x + WASTE_FAN_OFFSET * (card_index - (pile_size - waste_fan)), y
+    return x, y
+
+
+def mat_rect(pile_index, pile_size):
+    """(left, right, bottom, top) of the mat for a pile.
+    Mats under the play piles are stretched to cover the whole stack."""
+    x, y = pile_position(pile_index)
+    bottom = y - MAT_HEIGHT / 2
+    if PLAY_PILE_1 <= pile_index <= PLAY_PILE_7 and pile_size > 1:
+        bottom -= CARD_VERTICAL_OFFSET * (pile_size - 1)
+    return x - MAT_WIDTH / 2, x + MAT_WIDTH / 2, bottom, y + MAT_HEIGHT / 2
+
+
+def _column(x, first, count):
+    """Column of the row under x or None if x is between or outside the columns"""
+    column = math.floor((x - (START_X - CARD_WIDTH / 2)) / X_SPACING)
+    if column < 0 or column >= count:
+        return None
+    if x > START_X + column * X_SPACING + CARD_WIDTH / 2:
+        # In the gap between two piles
+        return None
+    return column
+
+
+def pile_at(x, y, pile_sizes, waste_fan=0):
+    """(pile index, card index) of the top card under the point.
+    The card index is None if the point is on the mat of an empty pile.
+    Returns None if the point is not on a pile."""
+    for row_y, first, count in ROWS:
+        if y > row_y + CARD_HEIGHT / 2:
+            continue
+        if first == PLAY_PILE_1:
+            # A play pile runs down the screen by CARD_VERTICAL_OFFSET per card
+            column = _column(x, first, count)
+            if column is None:
+                continue
+            pile_index = first + column
+            size = pile_sizes[pile_index]
+            if size == 0:
+                if y >= row_y - CARD_HEIGHT / 2:
+                    return pile_index, None
+                continue
+            card_index = min(size - 1, math.floor((row_y + CARD_HEIGHT / 2 - y) / CARD_VERTICAL_OFFSET))
+            if y >= row_y - CARD_VERTICAL_OFFSET * card_index - CARD_HEIGHT / 2:
+                return pile_index, card_index
+            continue
+        if y < row_y - CARD_HEIGHT / 2:
+            continue
+        size = pile_sizes[BOTTOM_FACE_UP_PILE]
+        if first == BOTTOM_FACE_DOWN_PILE and waste_fan > 0 and size > 0:
+            # Cards on the face up pile may be fanned out to the right
+            top_x = card_position(BOTTOM_FACE_UP_PILE, size - 1, size, waste_fan)[0]
+            for card_index in range(size - 1, max(size - waste_fan, 0) - 1, -1):
+                card_x = top_x - WASTE_FAN_OFFSET * (size - 1 - card_index)
+                if abs(x - card_x) <= CARD_WIDTH / 2:
+                    return BOTTOM_FACE_UP_PILE, card_index
+        column = _column(x, first, count)
+        if column is None:
+            return None
+        pile_index = first + column
+        size = pile_sizes[pile_index]
+        return pile_index, size - 1 if size > 0 else None
+    return None
+
+
+def drop_pile(x, y, pile_sizes):
+    """The pile whose mat is closest to a card centred on the point and touching it
+    or None if the card is not on any mat."""
+    best = None
+    best_distance = None
+    nearest = round((x - START_X) / X_SPACING)
+    for row_y, first, count in ROWS:
+        # Only the two columns either side of the card can touch it
+        for column in (nearest - 1, nearest, nearest + 1):
+            if column < 0 or column >= count:
+                continue
+            pile_index = first + column
+            left, right, bottom, top = mat_rect(pile_index, pile_sizes[pile_index])
+            if x + CARD_WIDTH / 2 < left or x - CARD_WIDTH / 2 > right or \
+                    y + CARD_HEIGHT / 2 < bottom or y - CARD_HEIGHT / 2 > top:
+                continue
+            distance = math.hypot(x - (left + right) / 2, y - (bottom + top) / 2)
+            if best is None or distance < best_distance:
+                best = pile_index
+                best_distance = distance
+    return best
+
+
+class Layout():
+    """Keeps the cards and mats of each pile where they belong.
+    Piles are marked dirty when cards are added to or removed from them and
+    only the dirty piles are laid out, once per frame, by update()."""
+
+    def __init__(self):
+        # Piles that have changed since the last update
+        self.dirty = set()
+        # Number of cards at the top of the face up pile that are fanned out to the right
+        self.waste_fan = 0
+
+    def mark(self, *pile_indexes):
+        """Mark piles as needing to be laid out"""
+        self.dirty.update(pile_indexes)
+
+    def mark_all(self):
+        """Mark every pile as needing to be laid out"""
+        self.dirty.update(range(PILE_COUNT))
+
+    def update(self, piles, mats, held=()):
+        """Position the cards and size the mats of the dirty piles.
+        Cards being held are left where they are."""
+        for pile_index in self.dirty:
+            pile = piles[pile_index]
+            for i, card in enumerate(pile):
+                if card not in held:
+                    card.position = card_position(pile_index, i, len(pile), self.waste_fan)
+            # Change mat size so it is fully covered by the card stack
+            # so mat only seen if no cards in pile
+            left, right, bottom, top = mat_rect(pile_index, len(pile))
+            mats[pile_index].height = top - bottom
+            mats[pile_index].top = top
+        self.dirty.clear()
@@ -0,0 +1,181 @@
+"""
+Where the memory goes, measured with tracemalloc.
+Each allocation is put down to the part of the game that made it by
+looking up its traceback for the first file that belongs to a part.
+The headless parts are also measured one at a time against a budget so
+the cost of a generator or solver worker is known before running many.
+
+    python memory_report.py             measure each part and show where the memory goes
+    python memory_report.py --check     also exit with an error if a measurement is over its budget
+
+In the game run `python Solitaire.py --trace-memory` and press T for a report.
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+import corpus
+import solver
+from engine import Game
+from transposition import ENTRY_BYTES, TranspositionTable
+
+# Frames kept for each allocation so it can be traced back to the game code
+TRACE_FRAMES = 25
+
+# Parts of the game and the start of the file names that belong to them.
+# The library files come first as an allocation inside arcade or PIL should be
+# put down to sprites or textures rather than the game code that called it.
+SUBSYSTEMS = [
+    ("textures", ("arcade/texture", "arcade/cache", "PIL/", "pyglet/image", "card_textures.py")),
+    ("sprites", ("arcade/sprite", "Solitaire.py")),
+    ("engine", ("engine.py", "layout.py")),
+    ("corpus", ("corpus.py",)),
+    ("solver tables", ("solver.py", "transposition.py", "parallel_search.py", "verify_deals.py")),
+    ("statistics", ("stats.py", "sqlite3/")),
+]
+
+# Most memory each measurement may use in bytes
+BUDGETS = {
+    "engine state": 4 * 1024,
+    "engine state copy": 4 * 1024,
+    "corpus deal": 1024,
+    "parsed deal": 1024,
+    # For each entry of the table, which has ENTRY_BYTES of arrays and nothing else
+    "transposition table entry": ENTRY_BYTES + 0.1,
+    "transposition table entry peak": ENTRY_BYTES + 0.1,
+    "search excluding table": 256 * 1024,
+    "generator game peak": 256 * 1024,
+}
+
+# Seed of a random hard mode deal the greedy player loses and the search does not
+# decide within SEARCH_NODES, so the search measured runs for all of them
+SEARCH_DEAL_SEED = 2006
+SEARCH_NODES = 5000
+
+
+def subsystem(traceback):
+    """Name of the part of the game an allocation belongs to"""
+    # The most recent frame is last
+    for frame in reversed(traceback):
+        file_name = frame.filename.replace("\\", "/")
+        for name, patterns in SUBSYSTEMS:
+            for pattern in patterns:
+                if pattern in file_name:
+                    return name
+    return "other"
+
+
+def by_subsystem(snapshot):
+    """Bytes held by each part of the game in a snapshot"""
+    sizes = {name: 0 for name, patterns in SUBSYSTEMS}
+    sizes["other"] = 0
+    for statistic in snapshot.statistics("traceback"):
+        sizes[subsystem(statistic.traceback)] += statistic.size
+    return sizes
+
+
+def start():
+    """Start tracing if it is not already running"""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+
+
+def report():
+    """Print the memory held by each part of the game now"""
+    sizes = by_subsystem(tracemalloc.take_snapshot())
+    total = sum(sizes.values())
+    print(f"Memory traced {total / 1024:.0f} KB")
+    for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+        print(f"  {name}: {size / 1024:.0f} KB ({size / total * 100 if total else 0:.0f}%)")
+
+
+def _traced():
+    """Bytes traced now after freeing anything that is no longer used"""
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def measure_each(make, count):
+    """Average bytes kept by each of count objects made by make()"""
+    before = _traced()
+    kept = [make(i) for i in range(count)]
+    size = _traced() - before
+    del kept
+    return size / count
+
+
+def measure_peak(run):
+    """(bytes kept, highest bytes in use above the start) while run() runs"""
+    before = _traced()
+    tracemalloc.reset_peak()
+    result = run()
+    peak = tracemalloc.get_traced_memory()[1] - before
+    size = _traced() - before
+    del result
+    return size, peak
+
+
+def search_game():
+    """The game the search is measured on"""
+    deal = list(range(52))
+    random.Random(SEARCH_DEAL_SEED).shuffle(deal)
+    return Game(deal, 3)
+
+
+def measurements():
+    """Measure each part of the engine, corpus and solver on its own"""
+    deals = [corpus.parse_deal(line) for line in corpus.winning_deals(3)]
+    played = Game(deals[0], 3)
+    solver.play_greedy(played)
+    results = {
+        "engine state": measure_each(lambda i: Game(deals[i % len(deals)], 3), 200),
+        "engine state copy": measure_each(lambda i: played.copy(), 200),
+        "parsed deal": measure_each(lambda i: corpus.parse_deal(corpus.winning_deals(3)[i % len(deals)]), 200),
+    }
+
+    # Read the file again to see what each line of it costs
+    corpus._loaded.clear()
+    size = measure_peak(lambda: corpus.winning_deals(3))[0]
+    results["corpus deal"] = size / len(corpus.winning_deals(3))
+
+    table_size, table_peak = measure_peak(TranspositionTable)
+    entries = TranspositionTable().size
+    results["transposition table entry"] = table_size / entries
+    results["transposition table entry peak"] = table_peak / entries
+
+    table = TranspositionTable(1024 * 1024)
+    results["search excluding table"] = measure_peak(lambda: solver.Search(search_game(), table).run(SEARCH_NODES))[1]
+
+    results["generator game peak"] = measure_peak(lambda: solver.play_greedy(Game(deals[1], 1)))[1]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show where the memory goes")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with an error if any measurement is over its budget")
+    args = parser.parse_args()
+    # Deal files are found next to this file wherever it is run from
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    start()
+    results = measurements()
+    over = 0
+    for name, size in results.items():
+        budget = BUDGETS[name]
+        result = "over budget" if size > budget else "ok"
+        if size > budget:
+            over += 1
+        print(f"{name}: {size:,.1f} bytes - budget {budget:,.1f} bytes - {result}")
+    report()
+    if args.check and over > 0:
+        print(f"{over} measurement(s) over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
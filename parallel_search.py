@@ -0,0 +1,193 @@
+"""
+Search one deal using all the cores of the machine.
+The first few moves from the start of the game are expanded into many
+positions and each is searched by whichever worker process is free next,
+so workers that finish quickly pick up more of the work. The positions are
+reached with the same steps the search makes. The workers share a count of
+the positions searched, so the node limit is for the whole search, a flag
+that stops them all as soon as one finds a win, and the positions handed out
+that have been found to be lost, so a worker whose search reaches one of them
+does not search it again.
+
+    python parallel_search.py --file winning-deals-hard.txt --line 12 --mode 3
+"""
+
+import argparse
+import collections
+import multiprocessing
+import os
+import time
+
+import corpus
+import solver
+from engine import Game
+from transposition import DEFAULT_TABLE_BYTES, TranspositionTable, describe
+
+# Positions searched by a worker between checks of the stop flag and node count
+SLICE_NODES = 5000
+
+# Number of positions to split the search into for each worker
+POSITIONS_PER_WORKER = 8
+
+# Shared between the worker processes, set up by init_worker()
+stop = None
+nodes_searched = None
+lost_keys = None
+lost_count = None
+table = None
+# The worker's copy of the positions in lost_keys
+lost = set()
+
+
+def init_worker(stop_event, shared_nodes, shared_lost_keys, shared_lost_count, table_bytes):
+    """Set up the objects shared by the workers and the worker's own table"""
+    global stop, nodes_searched, lost_keys, lost_count, table
+    stop = stop_event
+    nodes_searched = shared_nodes
+    lost_keys = shared_lost_keys
+    lost_count = shared_lost_count
+    table = TranspositionTable(table_bytes)
+
+
+def read_lost():
+    """Copy the positions other workers have found to be lost into lost"""
+    with lost_keys.get_lock():
+        keys = lost_keys[len(lost):lost_count.value] if lost_count.value > len(lost) else []
+    lost.update(keys)
+
+
+def add_lost(key):
+    """Tell the other workers a position is lost"""
+    with lost_keys.get_lock():
+        if lost_count.value < len(lost_keys):
+            lost_keys[lost_count.value] = key
+            lost_count.value += 1
+
+
+def split(game, count):
+    """Lists of moves from the start of the game that reach at least count different positions,
+    if there are that many, expanding a step of the search at a time across the whole width of it.
+    Returns (list of move lists, winning move list or None)."""
+    seen = {game.state_hash()}
+    frontier = [[]]
+    while len(frontier) < count:
+        expanded = []
+        for moves in frontier:
+            position = game.copy()
+            for move in moves:
+                position.apply(move)
+            for step in solver.search_steps(position):
+                for move in step:
+                    position.apply(move)
+                if position.is_won():
+                    return [], moves + step
+                key = position.state_hash()
+                if key not in seen:
+                    seen.add(key)
+                    expanded.append(moves + step)
+                for _ in step:
+                    position.undo()
+        if len(expanded) == 0:
+            # Every line of play has been followed to its end
+            return [], None
+        frontier = expanded
+    return frontier, None
+
+
+def search_from(task):
+    """Search the position reached by a list of moves.
+    Returns (status, winning moves from the start of the game or None,
+    (process id, counts() of the worker's table))."""
+    deal, cards_to_turn, moves, max_nodes = task
+    if stop.is_set() or nodes_searched.value >= max_nodes:
+        return solver.UNKNOWN, None, (os.getpid(), table.counts())
+    game = Game(deal, cards_to_turn)
+    for move in moves:
+        game.apply(move)
+    key = game.state_hash()
+    read_lost()
+    if key in lost:
+        return solver.UNSOLVABLE, None, (os.getpid(), table.counts())
+    search = solver.Search(game, table, lost)
+    while True:
+        done = search.nodes
+        status = search.run(SLICE_NODES)
+        with nodes_searched.get_lock():
+            nodes_searched.value += search.nodes - done
+            total = nodes_searched.value
+        if status == solver.SOLVED:
+            stop.set()
+            return status, moves + search.solution, (os.getpid(), table.counts())
+        if status == solver.UNSOLVABLE:
+            add_lost(key)
+            return status, None, (os.getpid(), table.counts())
+        read_lost()
+        if stop.is_set() or total >= max_nodes:
+            return solver.UNKNOWN, None, (os.getpid(), table.counts())
+
+
+def solve_parallel(deal, cards_to_turn, workers=None, max_nodes=solver.DEFAULT_MAX_NODES * 10,
+                   table_bytes=DEFAULT_TABLE_BYTES, greedy=True):
+    """Find out if a deal can be won using several processes.
+    If greedy the greedy player is tried first.
+    Returns (status, list of moves or None, nodes searched,
+    counts() of the workers' tables added up, empty if no worker was needed)."""
+    workers = workers or os.cpu_count()
+    game = Game(deal, cards_to_turn)
+    if greedy and solver.play_greedy(game):
+        return solver.SOLVED, [move for move, flipped in game.history], 0, collections.Counter()
+    frontier, solution = split(Game(deal, cards_to_turn), workers * POSITIONS_PER_WORKER)
+    if solution is not None:
+        return solver.SOLVED, solution, 0, collections.Counter()
+    if len(frontier) == 0:
+        return solver.UNSOLVABLE, None, 0, collections.Counter()
+
+    stop_event = multiprocessing.Event()
+    shared_nodes = multiprocessing.Value("q", 0)
+    status = solver.UNSOLVABLE
+    # The latest counts from each worker's table
+    tables = {}
+    tasks = [(deal, cards_to_turn, moves, max_nodes) for moves in frontier]
+    # Room for every position handed out to be found lost
+    lost_keys = multiprocessing.Array("Q", len(frontier))
+    lost_count = multiprocessing.Value("i", 0, lock=False)
+    with multiprocessing.Pool(workers, init_worker,
+                              (stop_event, shared_nodes, lost_keys, lost_count, table_bytes)) as pool:
+        # Results come back as each position is finished so a win is seen straight away
+        for result, moves, (pid, counts) in pool.imap_unordered(search_from, tasks):
+            tables[pid] = counts
+            if result == solver.SOLVED:
+                # Leaving the with block stops the other workers
+                return solver.SOLVED, moves, shared_nodes.value, sum(tables.values(), collections.Counter())
+            if result == solver.UNKNOWN:
+                status = solver.UNKNOWN
+    return status, None, shared_nodes.value, sum(tables.values(), collections.Counter())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search one deal using several processes")
+    parser.add_argument("--file", default=corpus.DEAL_FILES[3], help="deal file to read the deal from")
+    parser.add_argument("--line", type=int, default=1, help="line of the file holding the deal")
+    parser.add_argument("--mode", type=int, choices=[1, 3], default=3, help="cards turned over at a time")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes to use")
+    parser.add_argument("--max-nodes", type=int, default=solver.DEFAULT_MAX_NODES * 10,
+                        help="positions to search in total before giving up")
+    parser.add_argument("--search-only", action="store_true",
+                        help="search even if the greedy player wins, to time the search")
+    parser.add_argument("--table-mb", type=int, default=64,
+                        help="memory for the positions remembered by each process in MB")
+    args = parser.parse_args()
+
+    with open(args.file, "r") as file:
+        deal = corpus.parse_deal(file.readlines()[args.line - 1])
+    start = time.perf_counter()
+    status, moves, nodes, tables = solve_parallel(deal, args.mode, args.workers, args.max_nodes,
+                                                  args.table_mb * 1024 * 1024, not args.search_only)
+    print(f"{status} - {len(moves) if moves else 0} moves - {nodes} positions searched - "
+          f"{time.perf_counter() - start:.1f} seconds with {args.workers} worker(s)")
+    if tables:
+        print(f"Tables of the workers that searched: {describe(tables)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Cheap checks in front of the solver.
+A deal goes through the stages in order until one of them decides it,
+so only deals the cheap stages cannot decide reach the full search:
+
+    blocked   a card in the starting play piles can never move, so the deal is lost
+    greedy    the auto complete player wins it
+    search    the search wins it or runs out of moves within the full number of positions
+
+The search can see every card, which only makes the game easier, but it also
+leaves out moves it judges can never help, so a deal it runs out of moves on
+is taken to be lost rather than proved to be. Only the blocked stage proves a
+deal is lost.
+
+    python prefilter.py --mode 1 --deals 200     how many deals each stage decides and the time it takes
+"""
+
+import argparse
+import random
+import time
+
+import solver
+from engine import PLAY_PILES, Game, card_number, card_suit, is_red
+from transposition import TranspositionTable
+
+# Every stage in the order they are tried
+STAGES = ("blocked", "greedy", "search")
+
+
+def blocked_cards(game):
+    """Cards in the play piles that can never move, from the deal alone.
+    A card can first move once every card dealt on top of it has moved, and then only
+    to its top pile once the lower cards of its suit have moved, onto a card one higher
+    of the other colour that is showing, or if a king, into a pile that has been emptied.
+    Cards that pass are added until no more can be, treating the face down and
+    face up piles as always showing. Any card left can never move so the deal is lost."""
+    where = {}
+    for pile_index in PLAY_PILES:
+        for i, card in enumerate(game.piles[pile_index]):
+            where[card] = pile_index, i
+    moved = set()
+
+    def showing(card):
+        """True if every card dealt on top of the card has moved"""
+        if card not in where:
+            return True
+        pile_index, i = where[card]
+        return all(c in moved for c in game.piles[pile_index][i + 1:])
+
+    changed = True
+    while changed:
+        changed = False
+        for card in where:
+            if card in moved or not showing(card):
+                continue
+            number = card_number(card)
+            suit_start = card_suit(card) * 13
+            if all(c in moved or c not in where for c in range(suit_start, card)):
+                # Every lower card of its suit can be on the top pile
+                can_move = True
+            elif number == 13:
+                pile_index, i = where[card]
+                can_move = i == 0 or any(p != pile_index and all(c in moved for c in game.piles[p])
+                                         for p in PLAY_PILES)
+            else:
+                can_move = any(card_number(c) == number + 1 and is_red(c) != is_red(card) and showing(c)
+                               for c in range(52))
+            if can_move:
+                moved.add(card)
+                changed = True
+    return [card for card in where if card not in moved]
+
+
+def run_stages(game, stages=STAGES, max_nodes=solver.DEFAULT_MAX_NODES, table=None):
+    """Put a game through the stages until one decides it.
+    Returns (status, winning moves or None, [(stage, seconds) for each stage tried])."""
+    times = []
+    status, moves = solver.UNKNOWN, None
+    for stage in stages:
+        start = time.perf_counter()
+        if stage == "blocked":
+            if len(blocked_cards(game)) > 0:
+                status = solver.UNSOLVABLE
+        elif stage == "greedy":
+            played = game.copy()
+            if solver.play_greedy(played):
+                status, moves = solver.SOLVED, [move for move, flipped in played.history]
+        else:
+            search = solver.Search(game.copy(), table)
+            status = search.run(max_nodes)
+            moves = search.solution
+        times.append((stage, time.perf_counter() - start))
+        if status != solver.UNKNOWN:
+            break
+    return status, moves, times
+
+
+class Report():
+    """How many deals each stage decided and the time spent in it"""
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.tried = {stage: 0 for stage in stages}
+        self.won = {stage: 0 for stage in stages}
+        self.lost = {stage: 0 for stage in stages}
+        self.seconds = {stage: 0.0 for stage in stages}
+        self.unknown = 0
+
+    def add(self, status, times):
+        """Count the result of run_stages() for one deal"""
+        for stage, seconds in times:
+            self.tried[stage] += 1
+            self.seconds[stage] += seconds
+        stage = times[-1][0]
+        if status == solver.SOLVED:
+            self.won[stage] += 1
+        elif status == solver.UNSOLVABLE:
+            self.lost[stage] += 1
+        else:
+            self.unknown += 1
+
+    def print(self):
+        for stage in self.stages:
+            print(f"  {stage}: {self.tried[stage]} deals - {self.won[stage]} won - {self.lost[stage]} lost - "
+                  f"{self.seconds[stage]:.2f} seconds")
+        print(f"  not decided: {self.unknown}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how many deals each stage decides")
+    parser.add_argument("--mode", type=int, choices=[1, 3], default=1, help="cards turned over at a time")
+    parser.add_argument("--deals", type=int, default=200, help="number of random deals")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the deals")
+    parser.add_argument("--max-nodes", type=int, default=solver.DEFAULT_MAX_NODES,
+                        help="positions the full search looks at before giving up")
+    args = parser.parse_args()
+    deals = random.Random(args.seed)
+    table = TranspositionTable()
+    report = Report()
+    for _ in range(args.deals):
+        deal = list(range(52))
+        deals.shuffle(deal)
+        status, moves, times = run_stages(Game(deal, args.mode), max_nodes=args.max_nodes, table=table)
+        report.add(status, times)
+    report.print()
+
+
+if __name__ == "__main__":
+    main()
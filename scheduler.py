@@ -0,0 +1,186 @@
+"""
+Solve many deals at once in one process.
+Each deal is searched a slice of nodes at a time. Of the searches with the
+smallest budget, the one that has put the most cards on the top piles is run
+next, so deals that are nearly won are finished first and easy deals do not
+wait behind a hard one. A search that
+uses up its budget of nodes while other deals are waiting for a try with
+the smaller budget is parked as unknown, and carried on with a larger budget
+once they have had their try, so no deal can hold up the rest for long. Each
+running search has its own small table as searches of different deals must
+not share positions. A parked search gives its table up and gets an empty
+one when it carries on.
+For many processes give each one a Scheduler, as verify_deals.py --schedule does.
+
+    python scheduler.py --mode 3 --deals 200     compare with solving the same deals one after another
+"""
+
+import argparse
+import collections
+import random
+import time
+
+import solver
+from engine import Game
+from transposition import TranspositionTable
+
+# Nodes a search runs before the scheduler picks the next one to run
+SLICE_NODES = 2000
+
+# Searches run at once
+DEFAULT_SLOTS = 8
+
+# Memory for the positions remembered by each search
+SLOT_TABLE_BYTES = 8 * 1024 * 1024
+
+# Budget of nodes for the first try at a deal, each try after has this many times more
+FIRST_BUDGET = 20000
+BUDGET_GROWTH = 10
+
+
+def budgets(first_budget, max_nodes):
+    """The budget of nodes for each try at a deal, ending with max_nodes"""
+    budget = min(first_budget, max_nodes)
+    result = [budget]
+    while budget < max_nodes:
+        budget = min(budget * BUDGET_GROWTH, max_nodes)
+        result.append(budget)
+    return result
+
+
+class Solve():
+    """One position being solved by a Scheduler"""
+
+    def __init__(self, key, game):
+        self.key = key
+        self.game = game
+        # Which budget the search has
+        self.level = 0
+        self.search = None
+        self.table = None
+
+    def progress(self):
+        """The solve to run next has the smallest budget, then the most cards on the top piles
+        and then has used the fewest nodes"""
+        return -self.level, self.search.game.foundation_count(), -self.search.nodes
+
+
+class Scheduler():
+    """Searches for wins from many positions in turn, a slice of nodes at a time"""
+
+    def __init__(self, max_nodes=solver.DEFAULT_MAX_NODES, slots=DEFAULT_SLOTS, slice_nodes=SLICE_NODES,
+                 first_budget=FIRST_BUDGET, table_bytes=SLOT_TABLE_BYTES):
+        self.budgets = budgets(first_budget, max_nodes)
+        self.slice_nodes = slice_nodes
+        # Solves not yet running for each budget. Those parked for a larger budget wait
+        # until there are none left for the smaller budgets.
+        self.waiting = [collections.deque() for _ in self.budgets]
+        self.running = []
+        # Tables not in use by a running search
+        self.tables = [TranspositionTable(table_bytes) for _ in range(slots)]
+
+    def add(self, key, game):
+        """Add a position to solve, which can be done while run() is being iterated.
+        key is given back with the result."""
+        self.waiting[0].append(Solve(key, game))
+
+    def table_counts(self):
+        """counts() of all the tables added up"""
+        tables = self.tables + [solve.table for solve in self.running]
+        return sum((table.counts() for table in tables), collections.Counter())
+
+    def start_waiting(self):
+        """Start searches for waiting solves while there are free tables"""
+        while len(self.tables) > 0:
+            waiting = next((queue for queue in self.waiting if len(queue) > 0), None)
+            if waiting is None:
+                return
+            solve = waiting.popleft()
+            solve.table = self.tables.pop()
+            if solve.search is None:
+                solve.search = solver.Search(solve.game.copy(), solve.table)
+            else:
+                # Carry on a parked search
+                solve.search.use_table(solve.table)
+            self.running.append(solve)
+
+    def run(self):
+        """Yield (key, status, winning moves or None, nodes searched) for each position as
+        it is found to be won or lost, or UNKNOWN once it has used the largest budget.
+        Returns when there is nothing left to solve."""
+        while True:
+            self.start_waiting()
+            if len(self.running) == 0:
+                return
+            solve = max(self.running, key=Solve.progress)
+            search = solve.search
+            budget = self.budgets[solve.level]
+            status = search.run(min(self.slice_nodes, budget - search.nodes))
+            if status == solver.UNKNOWN and search.nodes < budget:
+                continue
+            if status == solver.UNKNOWN and solve.level + 1 < len(self.budgets):
+                solve.level += 1
+                if not any(len(queue) > 0 for queue in self.waiting[:solve.level]):
+                    # Nothing is waiting for a smaller budget so carry on keeping the table
+                    continue
+                # Park it to carry on with a larger budget once the others have had their try
+                self.running.remove(solve)
+                self.tables.append(solve.table)
+                solve.table = None
+                self.waiting[solve.level].append(solve)
+                continue
+            self.running.remove(solve)
+            self.tables.append(solve.table)
+            solve.table = None
+            yield solve.key, status, search.solution, search.nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare solving deals with the scheduler and one after another")
+    parser.add_argument("--mode", type=int, choices=[1, 3], default=3, help="cards turned over at a time")
+    parser.add_argument("--deals", type=int, default=200, help="number of random deals")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the deals")
+    parser.add_argument("--max-nodes", type=int, default=solver.DEFAULT_MAX_NODES,
+                        help="positions to search before giving up on a deal")
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="searches run at once")
+    args = parser.parse_args()
+    deals = random.Random(args.seed)
+    games = []
+    for _ in range(args.deals):
+        deal = list(range(52))
+        deals.shuffle(deal)
+        # Deals the greedy player wins take no searching so are left out
+        if not solver.play_greedy(Game(deal, args.mode)):
+            games.append(Game(deal, args.mode))
+
+    def show(name, finished, statuses, start):
+        """Print the time taken and how long the deals waited for their result"""
+        finished.sort()
+        counts = collections.Counter(statuses)
+        print(f"{name}: {len(finished)} deals in {time.perf_counter() - start:.1f} seconds - " +
+              " - ".join(f"{status} {counts[status]}" for status in (solver.SOLVED, solver.UNSOLVABLE, solver.UNKNOWN)))
+        print(f"  seconds until a deal's result: median {finished[len(finished) // 2]:.2f} - "
+              f"90th percentile {finished[len(finished) * 9 // 10]:.2f} - last {finished[-1]:.2f}")
+
+    # One after another with the same total memory for positions
+    table = TranspositionTable(SLOT_TABLE_BYTES * args.slots)
+    start = time.perf_counter()
+    finished, statuses = [], []
+    for game in games:
+        statuses.append(solver.Search(game.copy(), table).run(args.max_nodes))
+        finished.append(time.perf_counter() - start)
+    show("One after another", finished, statuses, start)
+
+    scheduler = Scheduler(args.max_nodes, args.slots)
+    for i, game in enumerate(games):
+        scheduler.add(i, game)
+    start = time.perf_counter()
+    finished, statuses = [], []
+    for key, status, moves, nodes in scheduler.run():
+        statuses.append(status)
+        finished.append(time.perf_counter() - start)
+    show("Scheduler", finished, statuses, start)
+
+
+if __name__ == "__main__":
+    main()
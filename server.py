@@ -0,0 +1,306 @@
+"""
+Play the game over a local connection.
+Each request is one line of JSON and gets one line of JSON back, so bots
+can play many games at once without opening a window. Games are kept as
+sessions that any connection can use by their id. Searching for a win
+is done in a pool of processes so it never holds up other requests.
+What the searches find is kept in the solver cache, so hints on a line
+already solved give the best move and solving it again is a look up.
+
+    python server.py                        serve on 127.0.0.1:8765
+    python server.py --load-test            play games against a running server and time the requests
+
+Requests, each with an "op" and the "session" it is for unless it is "new":
+    {"op": "new", "mode": 3, "seed": 42}    new random deal, or "corpus": true for a winning deal from the
+                                            file, or "generate": true for a winning deal just found
+    {"op": "state"}                         the piles, with face down cards as null
+    {"op": "moves"}                         the legal moves as [from pile, to pile, number of cards]
+    {"op": "apply", "move": [2, 9, 1]}      make a move
+    {"op": "undo"}                          take back the last move
+    {"op": "hint"}                          the best move if known, else the move auto complete would make, or null
+    {"op": "solve", "max_nodes": 200000}    search for a win from the current position
+    {"op": "close"}                         end the session
+Replies have "ok": true and the result, or "ok": false and an "error".
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import random
+import time
+
+import corpus
+import generator
+import solver
+import solver_cache
+from engine import Game, card_name
+from transposition import TranspositionTable
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Most sessions kept. The session used longest ago is dropped to make room.
+MAX_SESSIONS = 10000
+
+# Most positions a solve request may search
+MAX_SOLVE_NODES = 2000000
+
+# Tasks playing random deals given to the pool at a time for each mode when generating winning deals
+GENERATE_IN_FLIGHT = 2
+
+# Memory for the positions remembered by each solver process
+SOLVER_TABLE_BYTES = 16 * 1024 * 1024
+
+# Table and cache used by all the searches in a solver process, made when first needed
+table = None
+cache = None
+
+
+class RequestError(Exception):
+    """A request that cannot be carried out, reported back to the client"""
+
+
+def solver_game(deal, cards_to_turn, moves, cache_file):
+    """The position reached by a list of moves, making the table and cache of the solver process if needed"""
+    global table, cache
+    if table is None:
+        table = TranspositionTable(SOLVER_TABLE_BYTES)
+        cache = solver_cache.SolverCache(cache_file)
+    game = Game(deal, cards_to_turn)
+    for move in moves:
+        game.apply(move)
+    return game
+
+
+def solve_position(deal, cards_to_turn, moves, max_nodes, cache_file):
+    """Search for a win from the position reached by a list of moves.
+    Run in a solver process. Returns (status, winning moves or None, nodes searched)."""
+    game = solver_game(deal, cards_to_turn, moves, cache_file)
+    return solver_cache.solve_game(game, max_nodes, table, cache)
+
+
+def hint_position(deal, cards_to_turn, moves, cache_file):
+    """The best move from the position reached by a list of moves if the cache knows it,
+    else the move auto complete would make, or None.
+    Run in a solver process so the cache is not read on the event loop. Returns (move, solved)."""
+    game = solver_game(deal, cards_to_turn, moves, cache_file)
+    entry = cache.get(game)
+    if entry is not None and entry[0] == solver.SOLVED:
+        return entry[1], True
+    return solver.next_move(game), False
+
+
+def whole_number(value):
+    """True if a value from a request is a whole number, which JSON true and false are not"""
+    return type(value) is int
+
+
+def game_state(game):
+    """What a player can see of a game"""
+    piles = []
+    for pile_index, pile in enumerate(game.piles):
+        hidden = len(pile) if pile_index == 0 else game.face_down[pile_index]
+        piles.append([None] * hidden + [card_name(card) for card in pile[hidden:]])
+    return {"piles": piles, "foundation": game.foundation_count(), "won": game.is_won(),
+            "moves_made": len(game.history)}
+
+
+class GameServer():
+    """Sessions and the requests that act on them"""
+
+    def __init__(self, workers, cache_file=solver_cache.DEFAULT_CACHE, max_sessions=MAX_SESSIONS):
+        self.sessions = collections.OrderedDict()
+        # Only used by the solver processes
+        self.cache_file = cache_file
+        self.max_sessions = max_sessions
+        self.ids = itertools.count(1)
+        self.pool = concurrent.futures.ProcessPoolExecutor(workers)
+        # Winning deals found by the pool for each mode, started when first asked for
+        self.winning_deals = {}
+        self.winning_locks = {1: asyncio.Lock(), 3: asyncio.Lock()}
+        self.requests = 0
+
+    async def generated_deal(self, cards_to_turn):
+        """The next winning deal found by the pool for the mode"""
+        # Only one request at a time can take from a stream
+        async with self.winning_locks[cards_to_turn]:
+            if cards_to_turn not in self.winning_deals:
+                self.winning_deals[cards_to_turn] = generator.astream_winning_deals(
+                    cards_to_turn, self.pool, in_flight=GENERATE_IN_FLIGHT)
+            return await anext(self.winning_deals[cards_to_turn])
+
+    def session(self, request):
+        """The game for the session named in a request"""
+        session_id = request.get("session")
+        game = self.sessions.get(session_id) if isinstance(session_id, str) else None
+        if game is None:
+            raise RequestError("unknown session")
+        # Most recently used sessions are kept at the end
+        self.sessions.move_to_end(request["session"])
+        return game
+
+    def move(self, request):
+        """The move in a request as a tuple"""
+        move = request.get("move")
+        if not isinstance(move, list) or len(move) != 3 or not all(whole_number(value) for value in move):
+            raise RequestError("move must be [from pile, to pile, number of cards]")
+        return tuple(move)
+
+    async def handle(self, request):
+        """Carry out one request and return the reply"""
+        self.requests += 1
+        if not isinstance(request, dict):
+            raise RequestError("a request must be a JSON object")
+        op = request.get("op")
+        if op == "new":
+            cards_to_turn = request.get("mode", 1)
+            if not whole_number(cards_to_turn) or cards_to_turn not in (1, 3):
+                raise RequestError("mode must be 1 or 3")
+            if request.get("generate"):
+                deal = await self.generated_deal(cards_to_turn)
+            elif request.get("corpus"):
+                deal = corpus.random_winning_deal(cards_to_turn)
+                if deal is None:
+                    raise RequestError("no winning deals for this mode")
+            else:
+                seed = request.get("seed")
+                if not (whole_number(seed) or isinstance(seed, (str, type(None)))):
+                    raise RequestError("seed must be a number or a string")
+                deal = list(range(52))
+                random.Random(seed).shuffle(deal)
+            session_id = str(next(self.ids))
+            self.sessions[session_id] = Game(deal, cards_to_turn)
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+            return {"session": session_id, **game_state(self.sessions[session_id])}
+        game = self.session(request)
+        if op == "state":
+            return game_state(game)
+        if op == "moves":
+            return {"moves": game.legal_moves()}
+        if op == "apply":
+            move = self.move(request)
+            if move not in game.legal_moves():
+                raise RequestError("move is not legal")
+            game.apply(move)
+            return game_state(game)
+        if op == "undo":
+            if len(game.history) == 0:
+                raise RequestError("no moves to undo")
+            game.undo()
+            return game_state(game)
+        if op == "hint":
+            moves = [move for move, flipped in game.history]
+            move, solved = await asyncio.get_running_loop().run_in_executor(
+                self.pool, hint_position, game.deal, game.cards_to_turn, moves, self.cache_file)
+            return {"move": move, "solved": solved}
+        if op == "solve":
+            max_nodes = request.get("max_nodes", solver.DEFAULT_MAX_NODES)
+            if not whole_number(max_nodes):
+                raise RequestError("max_nodes must be a whole number")
+            max_nodes = min(max_nodes, MAX_SOLVE_NODES)
+            moves = [move for move, flipped in game.history]
+            status, solution, nodes = await asyncio.get_running_loop().run_in_executor(
+                self.pool, solve_position, game.deal, game.cards_to_turn, moves, max_nodes, self.cache_file)
+            return {"status": status, "moves": solution, "nodes": nodes}
+        if op == "close":
+            del self.sessions[request["session"]]
+            return {}
+        raise RequestError(f"unknown op {op!r}")
+
+    async def serve_client(self, reader, writer):
+        """Answer the requests from one connection, one line each, until it closes"""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = {"ok": True, **await self.handle(json.loads(line))}
+                except (RequestError, ValueError) as error:
+                    reply = {"ok": False, "error": str(error)}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host, port):
+        """Serve until stopped"""
+        server = await asyncio.start_server(self.serve_client, host, port)
+        print(f"Serving on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+async def play_games(host, port, games, mode, seed, times):
+    """One load test client: play games by following the hints. Returns games won."""
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(request):
+        start = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        times.append(time.perf_counter() - start)
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    won = 0
+    for game in range(games):
+        session = (await call({"op": "new", "mode": mode, "seed": seed * 1000 + game}))["session"]
+        for _ in range(solver.MAX_GREEDY_MOVES):
+            move = (await call({"op": "hint", "session": session}))["move"]
+            if move is None:
+                break
+            reply = await call({"op": "apply", "session": session, "move": move})
+            if reply["won"]:
+                won += 1
+                break
+        await call({"op": "close", "session": session})
+    writer.close()
+    return won
+
+
+async def load_test(host, port, clients, games, mode):
+    """Run many clients at once and report the request rate and times"""
+    times = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*[play_games(host, port, games, mode, client, times)
+                                     for client in range(clients)])
+    elapsed = time.perf_counter() - start
+    times.sort()
+    print(f"{clients} clients played {clients * games} games, won {sum(results)}")
+    print(f"{len(times)} requests in {elapsed:.1f} seconds - {len(times) / elapsed:.0f} requests a second")
+    print(f"Request time median {times[len(times) // 2] * 1000:.1f} ms - "
+          f"99th percentile {times[len(times) * 99 // 100] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the game over a local connection")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to serve on or connect to")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to serve on or connect to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes used to solve games")
+    parser.add_argument("--cache", default=solver_cache.DEFAULT_CACHE, help="solver cache file")
+    parser.add_argument("--load-test", action="store_true", help="play games against a running server")
+    parser.add_argument("--clients", type=int, default=100, help="clients playing at once in the load test")
+    parser.add_argument("--games", type=int, default=5, help="games played by each client in the load test")
+    parser.add_argument("--mode", type=int, choices=[1, 3], default=1, help="cards turned over in the load test")
+    args = parser.parse_args()
+    if args.load_test:
+        asyncio.run(load_test(args.host, args.port, args.clients, args.games, args.mode))
+    else:
+        try:
+            asyncio.run(GameServer(args.workers, args.cache).run(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Headless players for the Solitaire engine.
+play_greedy() plays the same way as the window's auto complete.
+Search looks through every sequence of moves for a win, a slice of
+nodes at a time, so a long search can be paused and carried on.
+Both reach the cards in the face down and face up piles through the
+engine's stock_index() rather than turning cards over one at a time.
+"""
+
+from engine import (BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE, PLAY_PILES, Game,
+                    card_number)
+from transposition import TranspositionTable
+
+# Results of a search
+SOLVED = "solved"
+UNSOLVABLE = "unsolvable"
+UNKNOWN = "unknown"
+
+# Number of positions looked at before a search gives up
+DEFAULT_MAX_NODES = 200000
+
+# Most moves the greedy player will make before giving up on a game
+MAX_GREEDY_MOVES = 2000
+
+
+def greedy_move(game):
+    """The move the window's auto complete would make next, not counting turning over cards.
+    None if there is no such move."""
+    # Moves to a top pile that can never be a mistake come first
+    move = game.safe_move()
+    if move is not None:
+        return move
+    piles = game.piles
+    for pile_index in PLAY_PILES:
+        pile = piles[pile_index]
+        if len(pile) > 0:
+            # Check if top card of middle stack can be moved to top pile
+            top_pile = game.foundation_for(pile[-1])
+            if game.can_drop(pile[-1], top_pile):
+                return pile_index, top_pile, 1
+            # Check if first face up card of middle stacks can be moved to another stack
+            i = game.face_down[pile_index]
+            if i == 0 and card_number(pile[i]) == 13:
+                # Don't check if we can move if the face up card is a king
+                continue
+            for to_pile in PLAY_PILES:
+                if to_pile != pile_index and game.can_drop(pile[i], to_pile):
+                    return pile_index, to_pile, len(pile) - i
+    waste = piles[BOTTOM_FACE_UP_PILE]
+    if len(waste) > 0:
+        top_pile = game.foundation_for(waste[-1])
+        if game.can_drop(waste[-1], top_pile):
+            return BOTTOM_FACE_UP_PILE, top_pile, 1
+        for to_pile in PLAY_PILES:
+            if game.can_drop(waste[-1], to_pile):
+                return BOTTOM_FACE_UP_PILE, to_pile, 1
+    return None
+
+
+def turn_moves(game):
+    """The moves that turn cards over to reach the next card in the face down and face up piles
+    that can be played, or None if there is no such card so there are no more moves.
+    Turning cards over one at a time stops at the same card."""
+    for card, turns in game.stock_index():
+        if game.can_drop(card, game.foundation_for(card)) or \
+                any(game.can_drop(card, to_pile) for to_pile in PLAY_PILES):
+            return game.turn_moves(turns)
+    return None
+
+
+def next_move(game):
+    """The move the window's auto complete would make next, including turning cards over,
+    or None if the game is won or there are no more moves"""
+    if game.is_won():
+        return None
+    move = greedy_move(game)
+    if move is None:
+        moves = turn_moves(game)
+        if moves is not None:
+            move = moves[0]
+    return move
+
+
+class GreedyPlayer():
+    """Plays a game a move at a time as the window's auto complete does"""
+
+    def __init__(self, game):
+        self.game = game
+
+    def next_move(self):
+        """The move to make next or None if the game is won or there are no more moves"""
+        return next_move(self.game)
+
+    def step(self):
+        """Make the next move and return it, or None if the game is over"""
+        move = self.next_move()
+        if move is not None:
+            self.game.apply(move)
+        return move
+
+
+def play_greedy(game, max_moves=MAX_GREEDY_MOVES):
+    """Play the game as the window's auto complete does.
+    Returns True if the game is won."""
+    player = GreedyPlayer(game)
+    for _ in range(max_moves):
+        if player.step() is None:
+            break
+    return game.is_won()
+
+
+def search_steps(game):
+    """The steps the search tries from a position, best first.
+    Each is a list of moves made in one step. Cards are not turned over one move at
+    a time, instead each card in the face down and face up piles that can be played
+    is reached and played in one step, which makes the lines searched much shorter."""
+    steps = []
+    for move in game.useful_moves():
+        if move[0] == BOTTOM_FACE_DOWN_PILE or move[1] == BOTTOM_FACE_DOWN_PILE:
+            steps.extend(game.stock_moves())
+        else:
+            steps.append([move])
+    return steps
+
+
+class Search():
+    """Depth first search for a win.
+    Call run() with a number of nodes to look at. It returns SOLVED or UNSOLVABLE
+    when the search is finished or UNKNOWN if it ran out of nodes and can be run again.
+    Positions already looked at are kept in a TranspositionTable of fixed size,
+    which may be shared by searches run one after another.
+    lost is a set of the state_hash() of positions already known to be lost, which
+    are not searched again. It may have positions added while the search runs."""
+
+    def __init__(self, game, table=None, lost=None):
+        self.game = game
+        # Positions already looked at
+        self.table = table if table is not None else TranspositionTable()
+        self.lost = lost if lost is not None else set()
+        self.table.new_search()
+        # Positions on the way to the current one. A position the table has
+        # forgotten is still never repeated on the current line of play.
+        self.path = [game.state_hash()]
+        self.on_path = set(self.path)
+        # Number of moves made by each step on the way to the current position
+        self.steps = []
+        self.table.seen(self.path[0], 0)
+        # Number of steps made so far
+        self.nodes = 0
+        self.status = UNKNOWN
+        # List of moves that wins the game once SOLVED
+        self.solution = None
+        # Moves the game had before the search started
+        self.start = len(game.history)
+        # Moves still to try at each depth, best move last
+        self.stack = [self.ordered_moves()]
+
+    def use_table(self, table):
+        """Carry on the search with another table. It is correct to do so, but
+        positions only remembered by the old table may be searched again."""
+        self.table = table
+        self.table.new_search()
+
+    def ordered_moves(self):
+        """Steps to try from the current position with the best last"""
+        steps = search_steps(self.game)
+        steps.reverse()
+        return steps
+
+    def run(self, max_nodes):
+        """Look at up to max_nodes more positions"""
+        game = self.game
+        limit = self.nodes + max_nodes
+        while self.stack:
+            if self.nodes >= limit:
+                return UNKNOWN
+            moves = self.stack[-1]
+            if len(moves) == 0:
+                # Tried everything from here so go back a move
+                self.stack.pop()
+                if self.stack:
+                    for _ in range(self.steps.pop()):
+                        game.undo()
+                    self.on_path.discard(self.path.pop())
+                continue
+            step = moves.pop()
+            for move in step:
+                game.apply(move)
+            self.nodes += 1
+            if game.is_won():
+                self.status = SOLVED
+                self.solution = [move for move, flipped in game.history[self.start:]]
+                self.stack = []
+                return SOLVED
+            key = game.state_hash()
+            if key in self.lost or self.table.seen(key, len(self.stack)) or key in self.on_path:
+                for _ in step:
+                    game.undo()
+                continue
+            self.steps.append(len(step))
+            self.path.append(key)
+            self.on_path.add(key)
+            self.stack.append(self.ordered_moves())
+        if self.status == UNKNOWN:
+            self.status = UNSOLVABLE
+        return self.status
+
+
+def solve(deal, cards_to_turn, max_nodes=DEFAULT_MAX_NODES, table=None):
+    """Find out if a deal can be won.
+    The greedy player is tried first as it wins most winnable deals at once.
+    Pass a TranspositionTable to reuse it rather than making a new one.
+    Returns (status, list of moves or None, nodes searched)."""
+    game = Game(deal, cards_to_turn)
+    if play_greedy(game):
+        return SOLVED, [move for move, flipped in game.history], 0
+    search = Search(Game(deal, cards_to_turn), table)
+    status = search.run(max_nodes)
+    return status, search.solution, search.nodes
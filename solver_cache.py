@@ -0,0 +1,251 @@
+"""
+Solver results kept on disk between runs.
+Each entry is a position of a deal with what the solver found from it:
+solved with the best move to make, unsolvable, or unknown after a number
+of positions were searched. When a win is found every position on the
+winning line is stored with its next move, so hints and auto complete
+along that line are a look up, and the position the search started from
+also keeps the whole line. The file is SQLite so any number of
+processes can share it. When it holds too many entries those used
+longest ago are removed.
+
+    python solver_cache.py              show how many entries are kept
+    python solver_cache.py --clear      remove every entry
+"""
+
+import argparse
+import sqlite3
+import time
+
+import solver
+
+# File the results are kept in
+DEFAULT_CACHE = "solver-cache.db"
+
+# Most entries kept, each is about 50 bytes on disk
+DEFAULT_MAX_ENTRIES = 1000000
+
+# Entries added between checks of the number of entries
+EVICT_EVERY = 1000
+
+# Raised when the search or the keys change so that entries made before can no longer be used.
+# 2: safe moves from the face up pile are no longer the only move, which wrongly
+# made some draw 3 deals unsolvable.
+# 3: positions are kept with the play piles in their order, as the moves kept name the piles.
+SOLVER_VERSION = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    deal_id INTEGER NOT NULL,
+    state INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    move TEXT,
+    line TEXT,
+    nodes INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (deal_id, state)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS positions_by_last_used ON positions(last_used);
+"""
+
+
+def _signed(key):
+    """A 64 bit hash as the signed integer SQLite stores"""
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def _format_moves(moves):
+    """Moves as stored, e.g. 0,1,3;2,9,1"""
+    return ";".join(",".join(str(n) for n in move) for move in moves)
+
+
+def _parse_moves(text):
+    """List of moves from their stored form"""
+    return [tuple(int(n) for n in move.split(",")) for move in text.split(";")]
+
+
+def _key(game):
+    """(deal id, state) of a position as stored.
+    The state keeps the order of the play piles, unlike the search's state_hash(), so the
+    best move kept for a position names the right piles."""
+    return _signed(game.deal_id()), _signed(game.position_hash())
+
+
+def _is_winning_line(game, moves):
+    """True if every move is legal in turn from the position and the game is then won"""
+    position = game.copy()
+    for move in moves:
+        if move not in position.legal_moves():
+            return False
+        position.apply(move)
+    return position.is_won()
+
+
+class SolverCache():
+    """Solver results for positions, shared through a file"""
+
+    def __init__(self, path=DEFAULT_CACHE, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        # Other processes may be writing so wait for them rather than fail
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # A crash may lose the last few results but never corrupts the file
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        with self.connection:
+            version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if version < SOLVER_VERSION:
+                # Entries from an older version are under other keys or may be wrong
+                self.connection.execute("DELETE FROM positions")
+                self.connection.execute(f"PRAGMA user_version = {SOLVER_VERSION}")
+        self.added = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, game, touch=False):
+        """(status, best move or None, nodes searched) for the position or None if not known.
+        A best move is only given if it is legal from the position.
+        If touch the entry counts as just used. Look ups from the window do not touch
+        the entry so the frame is never held up writing to the disk."""
+        key = _key(game)
+        row = self.connection.execute("SELECT status, move, nodes FROM positions WHERE deal_id = ? AND state = ?",
+                                      key).fetchone()
+        move = _parse_moves(row[1])[0] if row is not None and row[1] else None
+        if row is None or (move is not None and move not in game.legal_moves()):
+            # A move that is not legal means another position has the same hash
+            self.misses += 1
+            return None
+        self.hits += 1
+        if touch:
+            self.touch([key])
+        return row[0], move, row[2]
+
+    def has_deal(self, game):
+        """True if any position of the game's deal is known"""
+        return self.connection.execute("SELECT 1 FROM positions WHERE deal_id = ? LIMIT 1",
+                                       (_key(game)[0],)).fetchone() is not None
+
+    def put(self, game, status, moves, nodes):
+        """Store what the solver found from a position.
+        If solved, moves is the winning line and every position on it is stored."""
+        now = time.time()
+        rows = []
+        if status == solver.SOLVED:
+            position = game.copy()
+            for i, move in enumerate(moves):
+                line = _format_moves(moves) if i == 0 else None
+                rows.append((*_key(position), status, _format_moves([move]), line, nodes, now))
+                position.apply(move)
+        else:
+            rows.append((*_key(game), status, None, None, nodes, now))
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.added += len(rows)
+        if self.added >= EVICT_EVERY:
+            self.added = 0
+            self.evict()
+
+    def touch(self, keys):
+        """Count the entries for a list of (deal id, state) as just used"""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany("UPDATE positions SET last_used = ? WHERE deal_id = ? AND state = ?",
+                                        [(now, *key) for key in keys])
+
+    def evict(self):
+        """Remove the entries used longest ago if there are too many"""
+        count = len(self)
+        if count > self.max_entries:
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM positions WHERE (deal_id, state) IN "
+                    "(SELECT deal_id, state FROM positions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    def winning_line(self, game):
+        """The cached winning moves from a position or None if they are not all known"""
+        row = self.connection.execute("SELECT line FROM positions WHERE deal_id = ? AND state = ?",
+                                      _key(game)).fetchone()
+        if row is not None and row[0] and _is_winning_line(game, _parse_moves(row[0])):
+            # A search started from here so the whole line was kept
+            self.touch([_key(game)])
+            return _parse_moves(row[0])
+        position = game.copy()
+        moves = []
+        keys = []
+        while not position.is_won():
+            entry = self.get(position)
+            if entry is None or entry[0] != solver.SOLVED or len(moves) > solver.MAX_GREEDY_MOVES:
+                return None
+            keys.append(_key(position))
+            moves.append(entry[1])
+            position.apply(entry[1])
+        # The whole line is touched in one write
+        self.touch(keys)
+        return moves
+
+    def clear(self):
+        """Remove every entry"""
+        with self.connection:
+            self.connection.execute("DELETE FROM positions")
+
+    def close(self):
+        self.connection.close()
+
+
+def cached_result(game, max_nodes, cache):
+    """What the cache knows about a position as (status, list of moves or None, 0),
+    or None if it needs to be searched. A position left unknown is searched again
+    if more nodes are allowed than last time."""
+    entry = cache.get(game)
+    if entry is None:
+        return None
+    status, move, nodes = entry
+    if status == solver.SOLVED:
+        moves = cache.winning_line(game)
+        if moves is not None:
+            return status, moves, 0
+    elif status == solver.UNSOLVABLE or nodes >= max_nodes:
+        cache.touch([_key(game)])
+        return status, None, 0
+    return None
+
+
+def solve_game(game, max_nodes=solver.DEFAULT_MAX_NODES, table=None, cache=None):
+    """Find out if a position can be won, using and filling the cache if there is one.
+    Returns (status, list of moves or None, nodes searched)."""
+    if cache is not None:
+        result = cached_result(game, max_nodes, cache)
+        if result is not None:
+            return result
+    greedy = game.copy()
+    if solver.play_greedy(greedy):
+        status, moves, nodes = solver.SOLVED, [move for move, flipped in greedy.history], 0
+    else:
+        search = solver.Search(game.copy(), table)
+        status = search.run(max_nodes)
+        moves, nodes = search.solution, search.nodes
+    if cache is not None:
+        cache.put(game, status, moves, nodes)
+    return status, moves, nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clear the solver cache")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="solver cache file")
+    parser.add_argument("--clear", action="store_true", help="remove every entry")
+    args = parser.parse_args()
+    cache = SolverCache(args.cache)
+    if args.clear:
+        cache.clear()
+    print(f"{len(cache)} positions in {args.cache}")
+    for status, count in cache.connection.execute("SELECT status, COUNT(*) FROM positions GROUP BY status"):
+        print(f"  {status}: {count}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Watch many games being played at once.
+The window is tiled with small boards, each with its own engine game
+played by the same greedy player as pressing G in the game. When a game
+ends a new deal is dealt on that board. All the cards of every board are
+in one sprite list and all the mats in another, using the same textures,
+so each frame is drawn with a few calls however many boards there are.
+
+    python spectator.py --boards 16 --mode 3
+"""
+
+import argparse
+import math
+import random
+import time
+
+import arcade
+
+import corpus
+import layout
+import solver
+from engine import (CARD_SUITS, CARD_VALUES, PILE_COUNT, BOTTOM_FACE_DOWN_PILE, BOTTOM_FACE_UP_PILE,
+                    PLAY_PILE_1, PLAY_PILE_7, Game, card_suit)
+from layout import CARD_SCALE, MAT_WIDTH, MAT_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT
+from card_textures import FACE_DOWN_IMAGE, get_texture
+
+SCREEN_TITLE = "Solitaire - Spectator"
+
+# Default window size
+WINDOW_WIDTH = 1280
+WINDOW_HEIGHT = 960
+
+# Space between the boards in pixels
+BOARD_GAP = 6
+
+# Height of the line of text at the top of the window
+STATUS_HEIGHT = 24
+
+# Seconds a finished game stays on its board before the next deal
+FINISHED_TIME = 1.5
+
+# Moves made each second on each board
+DEFAULT_MOVES_PER_SECOND = 20
+# Longest time made up in one update so a stalled frame is not followed by a burst of moves
+MAX_STEP_TIME = 0.25
+
+
+def face_file(card):
+    """Image file for the face of an engine card"""
+    return f":resources:images/cards/card{CARD_SUITS[card_suit(card)]}{CARD_VALUES[card % 13]}.png"
+
+
+class Board():
+    """One game shown at a reduced size in a tile of the window"""
+
+    def __init__(self, x, y, scale, cards_to_turn, winning, sprite_list):
+        # Bottom left of the tile and how much the game is shrunk to fit it
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.cards_to_turn = cards_to_turn
+        self.winning = winning
+        # Sprite for each card indexed by engine card
+        self.sprites = []
+        for _ in range(52):
+            sprite = arcade.Sprite(get_texture(FACE_DOWN_IMAGE), CARD_SCALE * scale, hit_box_algorithm="None")
+            self.sprites.append(sprite)
+            sprite_list.append(sprite)
+        self.sprite_list = sprite_list
+        self.game = None
+        self.player = None
+        # Number of cards at the top of the face up pile that are fanned out
+        self.waste_fan = 0
+        # Time the finished game is replaced or 0 if still playing
+        self.finished_end = 0
+        self.won = False
+        self.deal()
+
+    def deal(self):
+        """Start a new game on the board"""
+        deck = corpus.random_winning_deal(self.cards_to_turn) if self.winning else None
+        if deck is None:
+            deck = list(range(52))
+            random.shuffle(deck)
+        self.game = Game(deck, self.cards_to_turn)
+        self.player = solver.GreedyPlayer(self.game)
+        self.waste_fan = 0
+        self.finished_end = 0
+        self.won = False
+        for pile_index in range(PILE_COUNT):
+            self.lay_out(pile_index, len(self.game.piles[pile_index]))
+
+    def lay_out(self, pile_index, moved=0):
+        """Position and turn over the cards of a pile.
+        The top moved cards have just arrived so are put on top in drawing order."""
+        pile = self.game.piles[pile_index]
+        for i, card in enumerate(pile):
+            sprite = self.sprites[card]
+            x, y = layout.card_position(pile_index, i, len(pile), self.waste_fan)
+            sprite.position = self.x + x * self.scale, self.y + y * self.scale
+            if pile_index == BOTTOM_FACE_DOWN_PILE or \
+                    PLAY_PILE_1 <= pile_index <= PLAY_PILE_7 and i < self.game.face_down[pile_index]:
+                sprite.texture = get_texture(FACE_DOWN_IMAGE)
+            else:
+                sprite.texture = get_texture(face_file(card))
+            if i >= len(pile) - moved:
+                self.sprite_list.remove(sprite)
+                self.sprite_list.append(sprite)
+
+    def step(self, now):
+        """Make the next move or deal again once a finished game has been shown.
+        Returns (True if a game just finished, True if it was won)."""
+        if self.finished_end:
+            if now >= self.finished_end:
+                self.deal()
+            return False, False
+        move = self.player.step()
+        if move is None:
+            self.finished_end = now + FINISHED_TIME
+            self.won = self.game.is_won()
+            return True, self.won
+        from_pile, to_pile, count = move
+        if from_pile == BOTTOM_FACE_DOWN_PILE:
+            self.waste_fan = count
+        elif from_pile == BOTTOM_FACE_UP_PILE:
+            self.waste_fan = max(0, self.waste_fan - 1)
+        if to_pile == BOTTOM_FACE_DOWN_PILE:
+            self.waste_fan = 0
+        self.lay_out(from_pile)
+        # The face down pile is one stack so its drawing order does not matter
+        self.lay_out(to_pile, count if to_pile != BOTTOM_FACE_DOWN_PILE else 0)
+        return False, False
+
+
+class Spectator(arcade.Window):
+    """Window tiled with boards that play themselves"""
+
+    def __init__(self, width, height, boards, cards_to_turn, winning, moves_per_second):
+        super().__init__(width, height, SCREEN_TITLE, update_rate=1 / 60, draw_rate=1 / 60)
+        arcade.set_background_color(arcade.color.AMAZON)
+        self.moves_per_second = moves_per_second
+        # Time owed to the boards in seconds, a move is made on every board for each step
+        self.move_time = 0
+        # Seconds of play since the window opened
+        self.clock = 0
+
+        # Lay the boards out in a grid as near square as the window allows
+        columns = math.ceil(math.sqrt(boards * width / height * SCREEN_HEIGHT / SCREEN_WIDTH))
+        rows = math.ceil(boards / columns)
+        tile_width = width / columns
+        tile_height = (height - STATUS_HEIGHT) / rows
+        scale = min((tile_width - BOARD_GAP) / SCREEN_WIDTH, (tile_height - BOARD_GAP) / SCREEN_HEIGHT)
+
+        # One sprite list for the cards of every board and one for every mat
+        self.card_list = arcade.SpriteList()
+        self.mat_list = arcade.SpriteList()
+        self.boards = []
+        for i in range(boards):
+            row, column = divmod(i, columns)
+            x = column * tile_width + (tile_width - SCREEN_WIDTH * scale) / 2
+            y = height - STATUS_HEIGHT - (row + 1) * tile_height + (tile_height - SCREEN_HEIGHT * scale) / 2
+            for pile_index in range(PILE_COUNT):
+                mat = arcade.SpriteSolidColor(MAT_WIDTH * scale, MAT_HEIGHT * scale, arcade.csscolor.DARK_OLIVE_GREEN)
+                mat.color = arcade.csscolor.DARK_OLIVE_GREEN
+                mat_x, mat_y = layout.pile_position(pile_index)
+                mat.position = x + mat_x * scale, y + mat_y * scale
+                self.mat_list.append(mat)
+            self.boards.append(Board(x, y, scale, cards_to_turn, winning, self.card_list))
+
+        self.games = 0
+        self.wins = 0
+        # Frames drawn since the frame rate was last shown
+        self.frames = 0
+        self.frames_start = time.perf_counter()
+        self.status = arcade.Text("", 8, height - STATUS_HEIGHT + 6, arcade.color.WHITE, 12)
+
+    def on_update(self, delta_time):
+        """Make the moves that are due on every board"""
+        self.move_time = min(self.move_time + delta_time, MAX_STEP_TIME)
+        self.clock += delta_time
+        now = self.clock
+        while self.move_time >= 1 / self.moves_per_second:
+            self.move_time -= 1 / self.moves_per_second
+            for board in self.boards:
+                finished, won = board.step(now)
+                if finished:
+                    self.games += 1
+                    self.wins += won
+
+    def on_draw(self):
+        """Draw every board"""
+        self.clear()
+        self.mat_list.draw()
+        self.card_list.draw()
+        self.frames += 1
+        now = time.perf_counter()
+        if now - self.frames_start >= 1:
+            percent = self.wins / self.games * 100 if self.games else 0
+            self.status.text = (f"{len(self.boards)} boards - {self.frames / (now - self.frames_start):.0f} fps - "
+                                f"games {self.games} - won {self.wins} ({percent:.0f}%)")
+            self.frames = 0
+            self.frames_start = now
+        self.status.draw()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch many games being played at once")
+    parser.add_argument("--boards", type=int, default=16, help="number of games to show")
+    parser.add_argument("--mode", type=int, choices=[1, 3], default=1, help="cards turned over at a time")
+    parser.add_argument("--winning", action="store_true", help="deal from the winning deal file")
+    parser.add_argument("--speed", type=float, default=DEFAULT_MOVES_PER_SECOND,
+                        help="moves made each second on each board")
+    parser.add_argument("--width", type=int, default=WINDOW_WIDTH, help="window width")
+    parser.add_argument("--height", type=int, default=WINDOW_HEIGHT, help="window height")
+    args = parser.parse_args()
+    Spectator(args.width, args.height, args.boards, args.mode, args.winning, args.speed)
+    arcade.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Statistics of played and generated games kept in a local SQLite file.
+Games are queued and written in batches by a background thread so that
+recording a game never waits for the disk.
+
+    python stats.py                 win rates by mode over the last 10000 games of each source
+"""
+
+import argparse
+import atexit
+import queue
+import sqlite3
+import threading
+
+# File the statistics are kept in
+DEFAULT_DB = "solitaire-stats.db"
+
+# Most games written in one transaction
+BATCH_SIZE = 500
+
+# Longest time in seconds a queued game waits before it is written
+FLUSH_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    id INTEGER PRIMARY KEY,
+    deal TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    deal_id INTEGER NOT NULL REFERENCES deals(id),
+    cards_to_turn INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    moves INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    finished TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS games_by_source ON games(source, cards_to_turn, id);
+CREATE INDEX IF NOT EXISTS games_by_deal ON games(deal_id);
+-- Made by earlier versions but never read, so it only slowed down writing games
+DROP INDEX IF EXISTS games_by_outcome;
+"""
+
+# Outcomes of a game
+WON = "won"
+LOST = "lost"
+ABANDONED = "abandoned"
+
+# Sources of games
+PLAYER = "player"
+GENERATOR = "generator"
+
+
+def connect(path):
+    """Open the statistics file, creating the tables if needed"""
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class StatsStore():
+    """Records games in the background.
+    record_game() only puts the game on a queue. A writer thread takes games
+    off the queue and writes them in one transaction per batch."""
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.queue = queue.Queue()
+        # Make sure the tables exist before anything is queued or read
+        connect(path).close()
+        self.writer = threading.Thread(target=self._write, name="stats-writer", daemon=True)
+        self.writer.start()
+        # Games still queued when the program ends are written before it exits
+        atexit.register(self.close)
+
+    def record_game(self, deal, cards_to_turn, source, outcome, moves, seconds):
+        """Queue one game. deal is the line from a deal file."""
+        self.queue.put((deal, cards_to_turn, source, outcome, moves, seconds))
+
+    def close(self):
+        """Write any queued games and stop the writer thread"""
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+    def _write(self):
+        """Writer thread"""
+        connection = connect(self.path)
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            # Gather more games until the batch is full or the queue is quiet
+            while len(batch) < BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self.queue.get(timeout=FLUSH_INTERVAL))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                running = False
+            games = [game for game in batch if game is not None]
+            if len(games) > 0:
+                with connection:
+                    connection.executemany("INSERT OR IGNORE INTO deals(deal) VALUES (?)",
+                                           [(game[0],) for game in games])
+                    connection.executemany(
+                        "INSERT INTO games(deal_id, cards_to_turn, source, outcome, moves, seconds) "
+                        "VALUES ((SELECT id FROM deals WHERE deal = ?), ?, ?, ?, ?, ?)", games)
+        connection.close()
+
+    def win_rate(self, cards_to_turn, last=10000, source=GENERATOR):
+        """(games, fraction won) over the last games from a source for a mode"""
+        connection = connect(self.path)
+        try:
+            row = connection.execute(
+                "SELECT COUNT(*), AVG(outcome = ?) FROM "
+                "(SELECT outcome FROM games WHERE source = ? AND cards_to_turn = ? ORDER BY id DESC LIMIT ?)",
+                (WON, source, cards_to_turn, last)).fetchone()
+        finally:
+            connection.close()
+        return row[0], row[1] or 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show game statistics")
+    parser.add_argument("--db", default=DEFAULT_DB, help="statistics file")
+    parser.add_argument("--last", type=int, default=10000, help="number of most recent games to include")
+    args = parser.parse_args()
+    store = StatsStore(args.db)
+    for source in (GENERATOR, PLAYER):
+        for cards_to_turn in (1, 3):
+            games, rate = store.win_rate(cards_to_turn, args.last, source)
+            if games > 0:
+                print(f"{source} turning {cards_to_turn}: {rate * 100:.1f}% of {games} games won")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
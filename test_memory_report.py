@@ -0,0 +1,45 @@
+"""
+The memory budgets in memory_report.py, checked without a window.
+
+    python -m pytest test_memory_report.py
+"""
+
+import os
+import tracemalloc
+
+import pytest
+
+import memory_report
+import solver
+
+
+def test_search_runs_for_all_its_nodes():
+    # Run before memory is traced as it is much slower while tracing
+    assert not solver.play_greedy(memory_report.search_game())
+    search = solver.Search(memory_report.search_game())
+    assert search.run(memory_report.SEARCH_NODES) == solver.UNKNOWN
+    assert search.nodes == memory_report.SEARCH_NODES
+
+
+@pytest.fixture(scope="module")
+def results():
+    """Each measurement, made once with the deal files next to this file"""
+    folder = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    tracing = tracemalloc.is_tracing()
+    memory_report.start()
+    try:
+        yield memory_report.measurements()
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+        os.chdir(folder)
+
+
+@pytest.mark.parametrize("name", memory_report.BUDGETS)
+def test_within_budget(results, name):
+    assert results[name] <= memory_report.BUDGETS[name], f"{name} uses {results[name]:,.1f} bytes"
+
+
+def test_every_measurement_has_a_budget(results):
+    assert set(results) == set(memory_report.BUDGETS)
@@ -0,0 +1,41 @@
+"""
+Checks of the scheduler that run without a window.
+
+    python -m pytest test_scheduler.py
+"""
+
+import random
+
+import scheduler
+import solver
+from engine import Game
+
+# Draw 3 deals the search decides in a few hundred nodes
+EASY_SEEDS = (2000, 2008, 2018, 2030, 2046)
+# Draw 3 deal the search has not decided after 20000 nodes
+HARD_SEED = 2006
+
+
+def random_game(seed):
+    deal = list(range(52))
+    random.Random(seed).shuffle(deal)
+    return Game(deal, 3)
+
+
+def test_larger_budget_waits_for_running_searches():
+    first_budget = 1000
+    tasks = scheduler.Scheduler(max_nodes=20000, slots=len(EASY_SEEDS) + 1, slice_nodes=50,
+                                first_budget=first_budget, table_bytes=1024 * 1024)
+    tasks.add(HARD_SEED, random_game(HARD_SEED))
+    for seed in EASY_SEEDS:
+        tasks.add(seed, random_game(seed))
+    finished = []
+    for key, status, moves, nodes in tasks.run():
+        finished.append(key)
+        if key != HARD_SEED:
+            assert status != solver.UNKNOWN, key
+            # The hard deal has not been searched past its first budget while an easy one was running
+            hard = [solve for solve in tasks.running if solve.key == HARD_SEED]
+            assert all(solve.search.nodes <= first_budget for solve in hard), key
+    assert sorted(finished[:-1]) == sorted(EASY_SEEDS)
+    assert finished[-1] == HARD_SEED
@@ -0,0 +1,31 @@
+"""
+Checks of the solver that run without a window.
+
+    python -m pytest test_solver.py
+"""
+
+import random
+
+import solver
+from engine import Game
+
+# Draw 3 deals that were wrongly found to be unsolvable when a safe move from the
+# face up pile was taken as the only move
+WASTE_SAFE_MOVE_SEEDS = (1100, 1116, 1125)
+
+
+def random_deal(seed):
+    deal = list(range(52))
+    random.Random(seed).shuffle(deal)
+    return deal
+
+
+def test_waste_safe_move_is_not_forced():
+    for seed in WASTE_SAFE_MOVE_SEEDS:
+        deal = random_deal(seed)
+        status, moves, nodes = solver.solve(deal, 3)
+        assert status == solver.SOLVED, seed
+        game = Game(deal, 3)
+        for move in moves:
+            game.apply(move)
+        assert game.is_won(), seed
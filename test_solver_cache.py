@@ -0,0 +1,45 @@
+"""
+Checks of the solver cache.
+
+    python -m pytest test_solver_cache.py
+"""
+
+import random
+
+import solver
+import solver_cache
+from engine import PLAY_PILE_1, Game
+
+
+def solved_game(seed, cards_to_turn=1):
+    """A random deal the solver wins, with its winning moves"""
+    while True:
+        deal = list(range(52))
+        random.Random(seed).shuffle(deal)
+        status, moves, nodes = solver.solve(deal, cards_to_turn, max_nodes=20000)
+        if status == solver.SOLVED:
+            return Game(deal, cards_to_turn), moves
+        seed += 1
+
+
+def test_moves_are_only_given_for_the_piles_in_their_order(tmp_path):
+    cache = solver_cache.SolverCache(str(tmp_path / "cache.db"))
+    for seed in range(8, 14):
+        game, moves = solved_game(seed)
+        cache.put(game, solver.SOLVED, moves, 0)
+        assert cache.winning_line(game) == moves
+        # The same cards with the first two play piles swapped round
+        swapped = game.copy()
+        first, second = PLAY_PILE_1, PLAY_PILE_1 + 1
+        swapped.piles[first], swapped.piles[second] = swapped.piles[second], swapped.piles[first]
+        swapped.face_down[first], swapped.face_down[second] = swapped.face_down[second], swapped.face_down[first]
+        assert swapped.state_hash() == game.state_hash()
+        entry = cache.get(swapped)
+        assert entry is None or entry[1] in swapped.legal_moves()
+        line = cache.winning_line(swapped)
+        if line is not None:
+            for move in line:
+                assert move in swapped.legal_moves()
+                swapped.apply(move)
+            assert swapped.is_won()
+    cache.close()
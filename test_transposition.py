@@ -0,0 +1,18 @@
+"""
+Checks of the transposition table.
+
+    python -m pytest test_transposition.py
+"""
+
+from transposition import TranspositionTable
+
+
+def test_entries_are_not_current_after_the_generation_wraps():
+    table = TranspositionTable(64 * 1024)
+    assert not table.seen(12345, 3)
+    assert table.seen(12345, 3)
+    # Start searches until the generation the entry was stored in comes round again
+    for _ in range(0xFFFF):
+        table.new_search()
+    assert table.generation == 1
+    assert not table.seen(12345, 3)
@@ -0,0 +1,120 @@
+"""
+Transposition table for the solver.
+Positions already searched are remembered in fixed size arrays so the
+memory used by a search is set when the table is made, however long the
+search runs. When the table is full, new positions replace old ones.
+"""
+
+import collections
+from array import array
+
+# Memory for a table if no size is given
+DEFAULT_TABLE_BYTES = 64 * 1024 * 1024
+
+# Bytes used by one entry: an 8 byte key, 2 byte depth and 2 byte generation
+ENTRY_BYTES = 12
+
+# Entries looked at for each key. A key can be stored in any slot of its bucket.
+BUCKET_SIZE = 2
+
+
+class TranspositionTable():
+    """Fixed size table of position hashes.
+    Each key can go in one bucket of BUCKET_SIZE slots. When a bucket is full
+    an entry left by an earlier search is replaced first, then the deepest entry
+    as it stands for the smallest part of the search."""
+
+    def __init__(self, max_bytes=DEFAULT_TABLE_BYTES):
+        # Number of buckets is a power of 2 so a key's bucket is a mask of its bits
+        buckets = 1
+        while buckets * 2 * BUCKET_SIZE * ENTRY_BYTES <= max_bytes:
+            buckets *= 2
+        self.mask = buckets - 1
+        self.size = buckets * BUCKET_SIZE
+        # Repeating a one entry array does not make a temporary copy of the whole table
+        self.keys = array("Q", [0]) * self.size
+        self.depths = array("H", [0]) * self.size
+        self.generations = array("H", [0]) * self.size
+        # Entries are only treated as current if they were stored by the current search
+        self.generation = 1
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.replaced = 0
+
+    def new_search(self):
+        """Start a new search. Entries from earlier searches are replaced first."""
+        self.generation = self.generation % 0xFFFF + 1
+        if self.generation == 1:
+            # The numbers have wrapped round so entries left from the last search numbered 1
+            # would look current. Mark every entry as from an earlier search instead.
+            self.generations = array("H", [0]) * self.size
+
+    def seen(self, key, depth):
+        """True if key is in the table from this search.
+        If not it is stored as found at depth."""
+        self.probes += 1
+        # 0 marks an empty slot
+        key = key or 1
+        first = (key & self.mask) * BUCKET_SIZE
+        keys = self.keys
+        depths = self.depths
+        generations = self.generations
+        for slot in range(first, first + BUCKET_SIZE):
+            if keys[slot] == key and generations[slot] == self.generation:
+                self.hits += 1
+                if depth < depths[slot]:
+                    # Reached sooner this time so worth keeping longer
+                    depths[slot] = depth
+                return True
+        # Not found so store it in an empty slot or over the least useful entry
+        victim = first
+        for slot in range(first + 1, first + BUCKET_SIZE):
+            if keys[victim] == 0:
+                break
+            if keys[slot] == 0 or self._worse(slot, victim):
+                victim = slot
+        if keys[victim] == 0:
+            self.used += 1
+        else:
+            self.replaced += 1
+        keys[victim] = key
+        depths[victim] = min(depth, 0xFFFF)
+        generations[victim] = self.generation
+        return False
+
+    def _worse(self, slot, other):
+        """True if slot is a better entry to replace than other"""
+        current = self.generation
+        if (self.generations[slot] == current) != (self.generations[other] == current):
+            return self.generations[slot] != current
+        return self.depths[slot] > self.depths[other]
+
+    def hit_rate(self):
+        """Fraction of look ups that found the position"""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def occupancy(self):
+        """Fraction of slots in use"""
+        return self.used / self.size
+
+    def memory(self):
+        """Bytes used by the arrays"""
+        return self.size * ENTRY_BYTES
+
+    def counts(self):
+        """The size and use of the table as a Counter, so tables in many processes can be added up"""
+        return collections.Counter(size=self.size, used=self.used, probes=self.probes, hits=self.hits,
+                                   replaced=self.replaced)
+
+    def __str__(self):
+        return describe(self.counts())
+
+
+def describe(counts):
+    """Summary of the counts() of one table or the sum of several"""
+    hit_rate = counts["hits"] / counts["probes"] if counts["probes"] else 0.0
+    occupancy = counts["used"] / counts["size"] if counts["size"] else 0.0
+    return (f"{counts['size']} entries ({counts['size'] * ENTRY_BYTES / 1024 / 1024:.1f} MB) - "
+            f"{occupancy * 100:.1f}% used - {hit_rate * 100:.1f}% hits - "
+            f"{counts['replaced']} replaced")
@@ -0,0 +1,252 @@
+"""
+Check the winning deal files.
+Every line of both files is checked to be a deal of the 52 cards and is
+solved again under the rules for its file (1 card turned over for the easy
+file, 3 for the hard file) using all the cores of the machine.
+Deals found unsolvable under their own rules that win under the other rules
+are moved to the other file. Deals the search gives up on are kept in their
+file and listed as not decided. Deals that are malformed, repeated or
+unsolvable under their own rules and not won under the other are dropped.
+
+    python verify_deals.py                  writes the checked files to verified/
+    python verify_deals.py --in-place       replaces the winning deal files
+
+With --schedule each worker is given lines a few dozen at a time and searches
+them together with a Scheduler, so a deal that takes a long search does not
+hold up the deals after it. Results are kept in the solver cache so deals already solved
+are not solved again on the next run. Use --no-cache to solve every deal
+from scratch.
+"""
+
+import argparse
+import collections
+import itertools
+import multiprocessing
+import os
+import time
+
+import corpus
+import scheduler
+import solver
+import solver_cache
+from engine import Game
+from transposition import TranspositionTable, describe
+
+# Lines handed to a worker at a time to be searched together
+CHUNK_LINES = 32
+
+# Table, scheduler and cache used by all the searches in a worker process, made when first needed
+table = None
+worker_scheduler = None
+cache = None
+
+
+def read_lines():
+    """Yield (cards to turn, line number, line) for every line of the deal files"""
+    for cards_to_turn, file_name in corpus.DEAL_FILES.items():
+        with open(file_name, "r") as file:
+            for line_no, line in enumerate(file, 1):
+                if line.strip() != "":
+                    yield cards_to_turn, line_no, line
+
+
+def table_counts():
+    """(process id, counts() of the worker's tables added up) to show in the summary"""
+    counts = collections.Counter()
+    if table is not None:
+        counts += table.counts()
+    if worker_scheduler is not None:
+        counts += worker_scheduler.table_counts()
+    return os.getpid(), counts
+
+
+def settles(cards_to_turn, mode, status):
+    """True if the status found with the rules for mode settles which file a deal from
+    the file for cards_to_turn goes in. A deal is only tried with the other rules once it
+    is found to be unsolvable with its own, and is left in its own file if the search
+    gave up on it."""
+    return status == solver.SOLVED or (status == solver.UNKNOWN and mode == cards_to_turn)
+
+
+def check_line(task):
+    """Check one line. Returns (cards to turn of its file, line number, deal or None,
+    cards to turn of the file it goes in or None if it is dropped, status or error message)"""
+    global table, cache
+    cards_to_turn, line_no, line, max_nodes, table_bytes, cache_file = task
+    try:
+        deal = corpus.parse_deal(line)
+    except ValueError as error:
+        return cards_to_turn, line_no, None, None, str(error)
+    status = solver.UNKNOWN
+    # Try the rules for its own file first and then the other file
+    for mode in sorted(corpus.DEAL_FILES, key=lambda m: m != cards_to_turn):
+        if table is None:
+            table = TranspositionTable(table_bytes)
+        if cache is None and cache_file is not None:
+            cache = solver_cache.SolverCache(cache_file)
+        status = solver_cache.solve_game(Game(deal, mode), max_nodes, table, cache)[0]
+        if settles(cards_to_turn, mode, status):
+            return cards_to_turn, line_no, deal, mode, status
+    return cards_to_turn, line_no, deal, None, status
+
+
+def verify_line(task):
+    """Check one line. Returns a list with the result of check_line() and table_counts()"""
+    return [check_line(task)], table_counts()
+
+
+def read_chunks(max_nodes, table_bytes, cache_file, slots):
+    """Yield the tasks for the workers, each a list of lines from read_lines() with the settings"""
+    lines = read_lines()
+    while True:
+        chunk = list(itertools.islice(lines, CHUNK_LINES))
+        if len(chunk) == 0:
+            return
+        yield chunk, max_nodes, table_bytes, cache_file, slots
+
+
+def verify_lines(task):
+    """Check a list of lines together. Returns a list with the result of check_line() for each line
+    and table_counts()"""
+    global worker_scheduler, cache
+    lines, max_nodes, table_bytes, cache_file, slots = task
+    if worker_scheduler is None:
+        # The worker's memory for positions is shared between the searches run at once
+        worker_scheduler = scheduler.Scheduler(max_nodes, slots, table_bytes=table_bytes // slots)
+        if cache_file is not None:
+            cache = solver_cache.SolverCache(cache_file)
+    results = [None] * len(lines)
+    deals = {}
+    # Rules still to try for each line, those for its own file first, and the last status found
+    modes = {}
+    statuses = {}
+
+    def try_next_mode(i):
+        """Try the next rules for line i, searching in the scheduler if they need a search"""
+        cards_to_turn, line_no, line = lines[i]
+        while len(modes[i]) > 0:
+            mode = modes[i].pop(0)
+            game = Game(deals[i], mode)
+            result = solver_cache.cached_result(game, max_nodes, cache) if cache is not None else None
+            if result is None:
+                greedy = game.copy()
+                if not solver.play_greedy(greedy):
+                    worker_scheduler.add((i, mode), game)
+                    return
+                result = solver.SOLVED, [move for move, flipped in greedy.history], 0
+                if cache is not None:
+                    cache.put(game, *result)
+            statuses[i] = result[0]
+            if settles(cards_to_turn, mode, result[0]):
+                results[i] = cards_to_turn, line_no, deals[i], mode, result[0]
+                return
+        results[i] = cards_to_turn, line_no, deals[i], None, statuses[i]
+
+    for i, (cards_to_turn, line_no, line) in enumerate(lines):
+        try:
+            deals[i] = corpus.parse_deal(line)
+        except ValueError as error:
+            results[i] = cards_to_turn, line_no, None, None, str(error)
+            continue
+        modes[i] = sorted(corpus.DEAL_FILES, key=lambda m: m != cards_to_turn)
+        try_next_mode(i)
+    for (i, mode), status, moves, nodes in worker_scheduler.run():
+        if cache is not None:
+            cache.put(Game(deals[i], mode), status, moves, nodes)
+        statuses[i] = status
+        if settles(lines[i][0], mode, status):
+            results[i] = lines[i][0], lines[i][1], deals[i], mode, status
+        else:
+            # Added to the scheduler while it is running if it needs a search
+            try_next_mode(i)
+    return results, table_counts()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and clean the winning deal files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes to use")
+    parser.add_argument("--max-nodes", type=int, default=solver.DEFAULT_MAX_NODES,
+                        help="positions to search before a deal is left in its file as not decided")
+    parser.add_argument("--table-mb", type=int, default=64,
+                        help="memory for the positions remembered by each process in MB")
+    parser.add_argument("--output", default="verified", help="folder to write the checked files to")
+    parser.add_argument("--in-place", action="store_true", help="replace the winning deal files")
+    parser.add_argument("--cache", default=solver_cache.DEFAULT_CACHE, help="solver cache file")
+    parser.add_argument("--no-cache", action="store_true", help="solve every deal without the solver cache")
+    parser.add_argument("--schedule", action="store_true",
+                        help="search many deals at once in each process a slice at a time")
+    parser.add_argument("--slots", type=int, default=scheduler.DEFAULT_SLOTS,
+                        help="searches each process runs at once with --schedule")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # Checked deals for each file in the order they were found
+    kept = {cards_to_turn: [] for cards_to_turn in corpus.DEAL_FILES}
+    seen = {cards_to_turn: set() for cards_to_turn in corpus.DEAL_FILES}
+    counts = {"lines": 0, "malformed": 0, "duplicate": 0, "moved": 0, "unsolvable": 0, "not decided": 0}
+    table_bytes = args.table_mb * 1024 * 1024
+    cache_file = None if args.no_cache else args.cache
+    # The latest counts from each worker's tables
+    tables = {}
+
+    def results(batches):
+        """Yield the result for each line from the lists the workers return"""
+        for batch, (pid, table_counts) in batches:
+            tables[pid] = table_counts
+            yield from batch
+
+    with multiprocessing.Pool(args.workers) as pool:
+        if args.schedule:
+            tasks = read_chunks(args.max_nodes, table_bytes, cache_file, args.slots)
+            batches = pool.imap(verify_lines, tasks)
+        else:
+            tasks = ((mode, line_no, line, args.max_nodes, table_bytes, cache_file)
+                     for mode, line_no, line in read_lines())
+            batches = pool.imap(verify_line, tasks, chunksize=4)
+        for cards_to_turn, line_no, deal, kept_in, status in results(batches):
+            counts["lines"] += 1
+            file_name = corpus.DEAL_FILES[cards_to_turn]
+            if deal is None:
+                counts["malformed"] += 1
+                print(f"{file_name}:{line_no} malformed - {status}")
+                continue
+            if kept_in is None:
+                counts["unsolvable"] += 1
+                print(f"{file_name}:{line_no} unsolvable turning {cards_to_turn} card(s) and not won "
+                      f"turning the other number - {status}")
+                continue
+            if status == solver.UNKNOWN:
+                counts["not decided"] += 1
+                print(f"{file_name}:{line_no} not decided within {args.max_nodes} positions - kept")
+            elif kept_in != cards_to_turn:
+                counts["moved"] += 1
+                print(f"{file_name}:{line_no} only wins turning {kept_in} card(s) - "
+                      f"moved to {corpus.DEAL_FILES[kept_in]}")
+            line = corpus.format_deal(deal)
+            if line in seen[kept_in]:
+                counts["duplicate"] += 1
+                print(f"{file_name}:{line_no} duplicate")
+                continue
+            seen[kept_in].add(line)
+            kept[kept_in].append(line)
+
+    folder = "." if args.in_place else args.output
+    os.makedirs(folder, exist_ok=True)
+    for cards_to_turn, lines in kept.items():
+        with open(os.path.join(folder, corpus.DEAL_FILES[cards_to_turn]), "w") as file:
+            for line in lines:
+                file.write(line + "\n")
+
+    print(f"Checked {counts['lines']} deals in {time.perf_counter() - start:.1f} seconds")
+    for name, count in counts.items():
+        if name != "lines":
+            print(f"  {name}: {count}")
+    for cards_to_turn, lines in kept.items():
+        print(f"  {os.path.join(folder, corpus.DEAL_FILES[cards_to_turn])}: {len(lines)} deals")
+    table_total = sum(tables.values(), collections.Counter())
+    if table_total:
+        print(f"Tables of the workers that searched: {describe(table_total)}")
+
+
+if __name__ == "__main__":
+    main()